@@ -3,27 +3,21 @@
 # This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
-import boto3
+import aws_clients
+from instance_config import get_identity_store_id
 from botocore.exceptions import ClientError
-
-
-def get_identiy_store_id():
-    client = boto3.client('sso-admin')
-    try:
-        response = client.list_instances()
-        return response['Instances'][0]['IdentityStoreId']
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-
-
-sso_instance = get_identiy_store_id()
+import identity_mirror
+from membership_index import index as membership_index
 
 
 def list_idc_group_membership(groupId):
+    memberships = identity_mirror.list_group_memberships(groupId)
+    if memberships is not None:
+        return memberships
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         p = client.get_paginator('list_group_memberships')
-        paginator = p.paginate(IdentityStoreId=sso_instance,
+        paginator = p.paginate(IdentityStoreId=get_identity_store_id(),
         GroupId=groupId,
         )
         all_groups=[]
@@ -32,13 +26,21 @@ def list_idc_group_membership(groupId):
         return all_groups
     except ClientError as e:
         print(e.response['Error']['Message'])
-        
+
+
+def list_member_ids(groupId):
+    memberships = list_idc_group_membership(groupId)
+    if memberships is None:
+        return None
+    return [member["MemberId"]["UserId"] for member in memberships if "UserId" in member.get("MemberId", {})]
+
+
 def handler(event, context):
     print(event)
-    members = []
-    groupIds = event["arguments"]["groupIds"]
-    for groupId in groupIds:
-        if members:
-            return {"members": members}
-        members.extend(list_idc_group_membership(groupId))
-    return {"members": members}
\ No newline at end of file
+    groupIds = [groupId for groupId in event["arguments"].get("groupIds") or [] if groupId]
+    # Every group is listed concurrently, results are kept per group for
+    # MEMBERSHIP_INDEX_TTL seconds (0 disables), or until the mirror completes
+    # its next sync, and members are returned once
+    membership_index.revalidate(identity_mirror.get_completed_at())
+    members = membership_index.members_of_any(groupIds, list_member_ids) if groupIds else []
+    return {"members": members}
@@ -2,20 +2,17 @@
 # This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
-from slack_sdk import WebClient
-import os
 import json
-import boto3
+import aws_clients
+from settings_cache import get_settings
 from datetime import datetime, timezone
 from dateutil import parser, tz
 
-session = boto3.Session()
-
 
 def send_ses_notification(
     source_email, source_arn, subject, message_html, to_addresses, cc_addresses
 ):
-    ses_client = session.client("ses")
+    ses_client = aws_clients.client("ses")
     try:
         # Providing a source arn enables using an SES identity in another account
         if source_arn:
@@ -42,7 +39,7 @@ def send_ses_notification(
 
 
 def send_sns_notification(notification_topic_arn, message, subject):
-    sns_client = session.client("sns")
+    sns_client = aws_clients.client("sns")
     try:
         sns_client.publish(
             TopicArn=notification_topic_arn,
@@ -65,13 +62,10 @@ def send_slack_notifications(
     ticket,
 ):
     try:
-        dynamodb = session.resource("dynamodb")
-        settings_table_name = os.getenv("SETTINGS_TABLE_NAME")
-        settings_table = dynamodb.Table(settings_table_name)
-        settings = settings_table.get_item(Key={"id": "settings"})
-        item_settings = settings.get("Item", {})
+        item_settings = get_settings()
         slack_token = item_settings.get("slackToken", "")
         if slack_token:
+            from slack_sdk import WebClient
             slack_client = WebClient(token=slack_token)
     except Exception as error:
         print(
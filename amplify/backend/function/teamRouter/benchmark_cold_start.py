@@ -0,0 +1,138 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares the init duration of every function, importing its src/index.py as
+checked out at a baseline revision and at HEAD, each in a fresh interpreter.
+AWS calls made at import (sso-admin list_instances, Organizations
+describe_organization, ...) are stubbed with a fixed latency and counted.
+Run from this directory, in a git checkout, with boto3 installed:
+
+    python benchmark_cold_start.py --runs 5 --latency-ms 60
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS = "amplify/backend/function"
+LAYER = "teamapplicationboto3layer/lib/python"
+
+# Run in the fresh interpreter: the function's src and the layer of the same tree
+# on the path, every API call answered from memory after latency seconds
+RUN = """
+import json, os, sys, time
+os.environ.update({env!r})
+sys.path[:0] = [{src!r}, {layer!r}]
+import botocore.client
+
+calls = []
+CANNED = {{
+    "ListInstances": {{"Instances": [{{"InstanceArn": "arn:aws:sso:::instance/ssoins-benchmark",
+                                     "IdentityStoreId": "d-benchmark"}}]}},
+    "DescribeOrganization": {{"Organization": {{"MasterAccountId": "111111111111"}}}},
+}}
+
+
+def make_api_call(self, operation_name, api_params):
+    calls.append(operation_name)
+    time.sleep({latency})
+    return CANNED.get(operation_name, {{}})
+
+
+botocore.client.BaseClient._make_api_call = make_api_call
+started = time.perf_counter()
+try:
+    import index
+except ImportError as e:
+    print(json.dumps({{"failed": "no " + str(e.name)}}))
+except Exception as e:
+    print(json.dumps({{"failed": type(e).__name__}}))
+else:
+    print(json.dumps({{"elapsed": time.perf_counter() - started, "calls": calls}}))
+"""
+
+ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_ACCESS_KEY_ID": "benchmark",
+    "AWS_SECRET_ACCESS_KEY": "benchmark",
+    "ACCOUNT_ID": "222222222222",
+    "API_TEAM_GRAPHQLAPIENDPOINTOUTPUT": "https://benchmark.appsync-api.us-east-1.amazonaws.com/graphql",
+    **{name: "benchmark" for name in (
+        "APPROVER_TABLE_NAME", "CACHE_TABLE_NAME", "GRANTS_TABLE_NAME", "IDENTITY_MIRROR_TABLE_NAME",
+        "ORG_STORE_TABLE_NAME", "POLICY_TABLE_NAME", "REQUESTS_TABLE_NAME", "SETTINGS_TABLE_NAME",
+    )},
+}
+
+
+def git(*args):
+    # From the top of the checkout, archive paths are relative to it
+    top = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=HERE, text=True).strip()
+    return subprocess.check_output(["git", *args], cwd=top, text=True).strip()
+
+
+def checkout(revision, directory):
+    # The functions of revision, extracted without touching the working tree
+    archive = os.path.join(directory, "tree.tar")
+    git("archive", "--format=tar", "-o", archive, revision, "--", FUNCTIONS)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory)
+    return os.path.join(directory, FUNCTIONS)
+
+
+def functions(root):
+    return {name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name, "src", "index.py"))}
+
+
+def measure(root, function, latency, runs):
+    code = RUN.format(env=ENV, src=os.path.join(root, function, "src"), layer=os.path.join(root, LAYER),
+                      latency=latency)
+    results = []
+    for _ in range(runs):
+        result = json.loads(subprocess.check_output([sys.executable, "-c", code], text=True).splitlines()[-1])
+        if "failed" in result:
+            return result
+        results.append(result)
+    return {"elapsed": statistics.median(result["elapsed"] for result in results), "calls": results[0]["calls"]}
+
+
+def describe(result):
+    if result is None:
+        return f"{'-':>17}"
+    if "failed" in result:
+        return f"{result['failed']:>17}"
+    return f"{result['elapsed'] * 1000:>7.1f} ms {len(result['calls']):>2} calls"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default=None, help="revision to compare with, the root commit by default")
+    parser.add_argument("--head", default="HEAD")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=60, help="per API call made at import")
+    args = parser.parse_args()
+
+    baseline = args.baseline or git("rev-list", "--max-parents=0", args.head).splitlines()[0]
+    with tempfile.TemporaryDirectory() as before_dir, tempfile.TemporaryDirectory() as after_dir:
+        before, after = checkout(baseline, before_dir), checkout(args.head, after_dir)
+        print(f"median of {args.runs} fresh interpreters, {args.latency_ms} ms per API call, "
+              f"{git('rev-parse', '--short', baseline)} -> {git('rev-parse', '--short', args.head)}")
+        print(f"{'function':<26} {'before':>17} {'after':>17}")
+        for function in sorted(functions(before) | functions(after)):
+            results = [
+                measure(root, function, args.latency_ms / 1000, args.runs) if function in functions(root) else None
+                for root in (before, after)
+            ]
+            print(f"{function:<26} {describe(results[0])} {describe(results[1])}")
+            for label, result in zip(("before", "after"), results):
+                if result and result.get("calls"):
+                    print(f"{'':<26} {label}: {', '.join(result['calls'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares keeping group memberships as sets of identity store id strings with
+MembershipIndex's interned int arrays, for memory and for the union over a
+requester's approver groups, on synthetic memberships and no AWS calls.
+Run from this directory with boto3 installed:
+
+    python benchmark_membership_index.py --users 100000 --groups 5000 --edges 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "teamapplicationboto3layer", "lib", "python"))
+
+from membership_index import MembershipIndex  # noqa: E402
+
+
+def synthetic(users, groups, edges, rng):
+    # Identity store ids, "<10 digit prefix>-<uuid>"
+    user_ids = [f"{rng.randrange(10 ** 10):010d}-{uuid.UUID(int=rng.getrandbits(128))}" for _ in range(users)]
+    group_ids = [f"{rng.randrange(10 ** 10):010d}-{uuid.UUID(int=rng.getrandbits(128))}" for _ in range(groups)]
+    members = {group_id: set() for group_id in group_ids}
+    for _ in range(edges):
+        members[rng.choice(group_ids)].add(rng.choice(user_ids))
+    return group_ids, members
+
+
+def build_sets(members):
+    # Before: group id -> set of member user id strings
+    return {group_id: set(user_ids) for group_id, user_ids in members.items()}
+
+
+def build_index(members):
+    # After: ids interned once, memberships as sorted array('I')
+    index = MembershipIndex(ttl=float("inf"))
+    for group_id, user_ids in members.items():
+        index.set_group_members(group_id, user_ids)
+    return index
+
+
+def allocated(build, members):
+    # The id strings exist before either structure, only the structure is counted
+    tracemalloc.start()
+    structure = build(members)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, size
+
+
+def union_sets(sets, group_ids):
+    users = set()
+    for group_id in group_ids:
+        users.update(sets.get(group_id, ()))
+    return sorted(users)
+
+
+def union_index(index, group_ids):
+    # Warm index, the loader is never called
+    return index.members_of_any(group_ids, lambda group_id: None)
+
+
+def measure(union, structure, queries):
+    started = time.perf_counter()
+    results = [union(structure, group_ids) for group_ids in queries]
+    return results, (time.perf_counter() - started) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--groups", type=int, default=5000)
+    parser.add_argument("--edges", type=int, default=200000)
+    parser.add_argument("--union", type=int, default=20, help="approver groups per query")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    group_ids, members = synthetic(args.users, args.groups, args.edges, rng)
+    queries = [rng.sample(group_ids, args.union) for _ in range(args.queries)]
+
+    sets, sets_bytes = allocated(build_sets, members)
+    index, index_bytes = allocated(build_index, members)
+    stats = index.stats()
+    print(f"{stats['users']} users, {stats['groups']} groups, {stats['edges']} edges, "
+          f"union over {args.union} groups")
+    print(f"{'sets of id strings':<22} {sets_bytes / 2 ** 20:>10.2f} MB")
+    print(f"{'MembershipIndex':<22} {index_bytes / 2 ** 20:>10.2f} MB, "
+          f"{stats['arrayBytes'] / 2 ** 20:.2f} MB of arrays")
+    results = {}
+    for name, union, structure in (("sets of id strings", union_sets, sets), ("MembershipIndex", union_index, index)):
+        results[name], elapsed = measure(union, structure, queries)
+        print(f"{name:<22} {elapsed * 1000:>10.3f} ms per union")
+    # members_of_any orders users by interned number, not by id
+    pairs = zip(results["sets of id strings"], results["MembershipIndex"])
+    differ = sum(set(before) != set(after) for before, after in pairs)
+    print(f"{differ} of {args.queries} unions differ")
+
+
+if __name__ == "__main__":
+    main()
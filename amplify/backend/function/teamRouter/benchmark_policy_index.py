@@ -0,0 +1,111 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares the eligibility decision of teamRouter before and after PolicyIndex
+for random requests against synthetic resolved policies, using no AWS calls.
+The index is timed compiled per request and cached by entitlements, as teamRouter
+uses it. Also counts the requests the nested loops disagree on. Run from this directory with
+boto3 installed:
+
+    python benchmark_policy_index.py --accounts 2000 --groups 8 --requests 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "teamapplicationboto3layer", "lib", "python"))
+
+import entitlements  # noqa: E402
+from policy_engine import PolicyIndex  # noqa: E402
+
+
+def synthetic(accounts, groups, permissions):
+    policies = []
+    for group in range(groups):
+        policies.append({
+            "id": f"group-{group}",
+            "name": f"group-{group}",
+            # Broad policies, as left by OU expansion
+            "accounts": [{"name": f"account-{i}", "id": f"{i:012d}"} for i in range(accounts) if i % groups != group],
+            "permissions": [{"name": f"permission-set-{p}", "id": f"ps-{p}"} for p in range(group % 2, permissions + group % 2)],
+            "approvalRequired": group % 3 != 0,
+            "duration": str(1 + group % 8),
+        })
+    return policies
+
+
+def legacy(policies, request):
+    # Before: teamRouter walked policies x accounts x permissions for every request,
+    # and compared the request with each policy's running maximum duration
+    eligible = False
+    max_duration = 0
+    for policy in policies:
+        max_duration = max(max_duration, int(policy["duration"]))
+        if int(request["time"]) > max_duration:
+            return None
+        for account in policy["accounts"]:
+            if request["accountId"] == account["id"]:
+                for permission in policy["permissions"]:
+                    if request["roleId"] == permission["id"]:
+                        if policy["approvalRequired"]:
+                            return {"approval": True}
+                        eligible = True
+    return {"approval": False} if eligible else None
+
+
+def per_request(policies, request):
+    # Compiled for the request's account, then thrown away
+    decision = PolicyIndex(policies, request["accountId"]).decide(request["accountId"], request["roleId"], request["time"])
+    return {"approval": decision["approvalRequired"]} if decision["eligible"] else None
+
+
+def cached(policies, request):
+    # After: compiled once per principal set and version next to the resolved policies
+    index = entitlements.get_policy_index("user", ["group"], consistent=True)
+    decision = index.decide(request["accountId"], request["roleId"], request["time"])
+    return {"approval": decision["approvalRequired"]} if decision["eligible"] else None
+
+
+def measure(decide, policies, requests):
+    started = time.perf_counter()
+    decisions = [decide(policies, request) for request in requests]
+    return decisions, (time.perf_counter() - started) / len(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--permissions", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    policies = synthetic(args.accounts, args.groups, args.permissions)
+    rng = random.Random(args.seed)
+    requests = [
+        {"accountId": f"{rng.randrange(args.accounts):012d}", "roleId": f"ps-{rng.randrange(args.permissions + 1)}",
+         "time": str(rng.randint(1, 8))}
+        for _ in range(args.requests)
+    ]
+    print(f"{args.accounts} accounts, {args.groups} policies, {args.permissions} permission sets, "
+          f"{args.requests} requests")
+    # The container tier only, resolving returns the synthetic policies
+    entitlements.cache_table_name = None
+    entitlements.resolve_policies = lambda user_id, group_ids, version=None: policies
+    results = {}
+    cases = (("nested loops", legacy), ("PolicyIndex per request", per_request), ("cached PolicyIndex", cached))
+    for name, decide in cases:
+        results[name], elapsed = measure(decide, policies, requests)
+        print(f"{name:<24} {elapsed * 1000:>10.3f} ms per request")
+    for name, _ in cases[1:]:
+        differ = sum(before != after for before, after in zip(results["nested loops"], results[name]))
+        print(f"{name}: {differ} of {args.requests} decisions differ from the nested loops")
+    print("the running maximum of the nested loops rejected requests that a policy with a longer duration allows")
+
+if __name__ == "__main__":
+    main()
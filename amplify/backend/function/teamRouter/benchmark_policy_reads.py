@@ -0,0 +1,106 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares reading the Eligibility items of a user and its groups with one
+GetItem per principal against chunked BatchGetItem, using an in-memory table
+that adds a fixed latency per call and no AWS calls. Run from this directory
+with boto3 installed:
+
+    python benchmark_policy_reads.py --groups 50 --latency-ms 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "teamapplicationboto3layer", "lib", "python"))
+
+import aws_clients  # noqa: E402
+from batch_get import batch_get_items  # noqa: E402
+
+TABLE_NAME = "Eligibility-benchmark"
+
+
+class Table:
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+
+    def get_item(self, Key):
+        self.dynamodb.wait()
+        item = self.dynamodb.items.get(Key['id'])
+        return {"Item": item} if item else {}
+
+
+class DynamoDB:
+    """Serves items from memory, each call costs latency seconds."""
+
+    def __init__(self, items, latency):
+        self.items = items
+        self.latency = latency
+        self.calls = 0
+
+    def wait(self):
+        self.calls += 1
+        time.sleep(self.latency)
+
+    def Table(self, name):
+        return Table(self)
+
+    def batch_get_item(self, RequestItems):
+        self.wait()
+        (name, request), = RequestItems.items()
+        found = [self.items[key['id']] for key in request['Keys'] if key['id'] in self.items]
+        return {"Responses": {name: found}, "UnprocessedKeys": {}}
+
+
+def synthetic(groups, with_policy):
+    ids = ["user"] + [f"group-{group}" for group in range(groups)]
+    # Only some principals have a policy, the others are read for nothing
+    items = {
+        id: {"id": id, "accounts": [], "ous": [], "permissions": [], "approvalRequired": True, "duration": "1"}
+        for position, id in enumerate(ids) if position % with_policy == 0
+    }
+    return ids, items
+
+
+def one_by_one(ids):
+    # Before: one GetItem per principal
+    table = aws_clients.resource('dynamodb').Table(TABLE_NAME)
+    return [response["Item"] for response in (table.get_item(Key={'id': id}) for id in ids) if "Item" in response]
+
+
+def batched(ids):
+    # After: ceil(n / 100) BatchGetItem calls
+    return batch_get_items(TABLE_NAME, [{'id': id} for id in ids])
+
+
+def measure(read, ids, dynamodb, repeat):
+    dynamodb.calls = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        found = read(ids)
+    elapsed = (time.perf_counter() - started) / repeat
+    return len(found), dynamodb.calls // repeat, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--with-policy", type=int, default=3, help="every n-th principal has a policy")
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ids, items = synthetic(args.groups, args.with_policy)
+    dynamodb = DynamoDB(items, args.latency_ms / 1000)
+    aws_clients.resources[('dynamodb', None)] = dynamodb
+    print(f"{len(ids)} principals, {len(items)} policies, {args.latency_ms} ms per call")
+    for name, read in (("GetItem per principal", one_by_one), ("BatchGetItem", batched)):
+        found, calls, elapsed = measure(read, ids, dynamodb, args.repeat)
+        print(f"{name:<22} {found:>6} items {calls:>6} calls {elapsed * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
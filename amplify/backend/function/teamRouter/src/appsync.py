@@ -0,0 +1,102 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import random
+import threading
+import time
+import aws_clients
+import requests
+from requests.adapters import HTTPAdapter
+from requests_aws_sign import AWSV4Sign
+
+REQUEST_FIELDS = (
+    "id",
+    "email",
+    "accountId",
+    "accountName",
+    "role",
+    "roleId",
+    "startTime",
+    "duration",
+    "justification",
+    "status",
+    "comment",
+    "username",
+    "approver",
+    "approverId",
+    "approvers",
+    "approver_ids",
+    "revoker",
+    "revokerId",
+    "endTime",
+    "ticketNo",
+    "revokeComment",
+    "createdAt",
+    "updatedAt",
+    "owner",
+)
+
+UPDATE_REQUESTS_MUTATION = """
+    mutation UpdateRequests(
+        $input: UpdateRequestsInput!
+        $condition: ModelRequestsConditionInput
+    ) {
+        updateRequests(input: $input, condition: $condition) {
+        %s
+        }
+    }
+"""
+
+UPDATE_REQUEST_QUERY = UPDATE_REQUESTS_MUTATION % "\n        ".join(REQUEST_FIELDS)
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class AppSyncClient:
+    def __init__(self, endpoint, timeout=(3.05, 10), max_attempts=3, pool_size=10):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.region = aws_clients.session.region_name
+        self.credentials = aws_clients.session.get_credentials()
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.http.headers.update({"Content-Type": "application/json"})
+        self._auth = None
+        self._auth_credentials = None
+        self._lock = threading.Lock()
+
+    def auth(self):
+        # botocore refreshes the underlying credentials shortly before they expire,
+        # the signer is only rebuilt when that happens
+        frozen = self.credentials.get_frozen_credentials()
+        with self._lock:
+            if frozen != self._auth_credentials:
+                self._auth = AWSV4Sign(frozen, self.region, 'appsync')
+                self._auth_credentials = frozen
+            return self._auth
+
+    def execute(self, query, variables):
+        payload = {"query": query, "variables": variables}
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = self.http.post(
+                    self.endpoint,
+                    auth=self.auth(),
+                    json=payload,
+                    timeout=self.timeout
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_attempts:
+                    return response.json()
+                print(f"AppSync returned {response.status_code}, retrying")
+            except (requests.ConnectionError, requests.Timeout) as exception:
+                if attempt == self.max_attempts:
+                    raise
+                print(f"AppSync request failed, retrying: {exception}")
+            time.sleep(random.uniform(0, min(2, 0.1 * 2 ** attempt)))
+
+    def update_request(self, input):
+        # Every onUpdateRequests subscriber receives this selection, and selects the
+        # non-nullable fields of requests, so it cannot be narrowed per write
+        return self.execute(UPDATE_REQUEST_QUERY, {"input": input})
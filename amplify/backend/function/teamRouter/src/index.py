@@ -4,22 +4,25 @@
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 import os
 import json
-import boto3
-import requests
+import threading
+import aws_clients
 from botocore.exceptions import ClientError
-from requests_aws_sign import AWSV4Sign
-import asyncio
-from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from policy_engine import PolicyIndex
+import identity_cache
+from instance_config import get_identity_store_id, get_instance_arn
+from settings_cache import get_settings
+import ps_catalog
+from batch_get import batch_get_items
+import org_store
+from entitlements import get_policy_index
+import grants
+import identity_mirror
+from membership_index import index as membership_index
     
-policy_table_name = os.getenv("POLICY_TABLE_NAME")
-settings_table_name = os.getenv("SETTINGS_TABLE_NAME")
 approver_table_name = os.getenv("APPROVER_TABLE_NAME")
 requests_table_name = os.getenv("REQUESTS_TABLE_NAME")
 user_pool_id = os.getenv("AUTH_TEAM06DBB7FC_USERPOOLID")
-dynamodb = boto3.resource('dynamodb')
-approver_table = dynamodb.Table(approver_table_name)
-policy_table = dynamodb.Table(policy_table_name)
-settings_table = dynamodb.Table(settings_table_name)
 
 grant = os.getenv("GRANT_SM")
 revoke = os.getenv("REVOKE_SM")
@@ -30,6 +33,11 @@ notification_topic_arn = os.getenv("NOTIFICATION_TOPIC_ARN")
 sso_login_url = os.getenv("SSO_LOGIN_URL")
 fn_teamstatus_arn = os.getenv("FN_TEAMSTATUS_ARN")
 fn_teamnotifications_arn = os.getenv("FN_TEAMNOTIFICATIONS_ARN")
+max_workers = int(os.getenv("MAX_WORKERS", "10"))
+appsync_client = None
+appsync_lock = threading.Lock()
+# Id of the request the current thread is working on, prefixed to its log lines
+request_context = threading.local()
 team_config = {
     "sso_login_url": sso_login_url,
     "requests_table": requests_table_name,
@@ -41,70 +49,37 @@ team_config = {
 
 
 
-def list_account_for_ou(ouId):
-    account = []
-    client = boto3.client('organizations')
-    try:
-        p = client.get_paginator('list_accounts_for_parent')
-        paginator = p.paginate(ParentId=ouId,)
+def log(message):
+    request_id = getattr(request_context, "request_id", None)
+    print(f"[{request_id}] {message}" if request_id else message)
 
-        for page in paginator:
-            for acct in page['Accounts']:
-                account.extend([{"name": acct['Name'], 'id':acct['Id']}])
-        return account
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-
-
-def get_entitlements(id):
-    response = policy_table.get_item(
-        Key={
-            'id': id
-        }
-    )
-    return response
-
-
-def get_settings():
-    response = settings_table.get_item(
-        Key={
-            'id': 'settings'
-        }
-    )
-    return response
-
-def getEntitlements(userId, groupIds):
-    eligibility = []
-    maxDuration = 0
-    for id in [userId] + groupIds:
-        if not id:
-            continue
-        entitlement = get_entitlements(id)
-        if "Item" not in entitlement.keys():
-            continue
-        duration = entitlement['Item']['duration']
-        if int(duration) > maxDuration:
-            maxDuration = int(duration)
-        policy = {}
-        policy['accounts'] = entitlement['Item']['accounts']
-        
-        for ou in entitlement["Item"]["ous"]:
-            data = list_account_for_ou(ou["id"])
-            policy['accounts'].extend(data)
-            
-        policy['permissions'] = entitlement['Item']['permissions']
-        policy['approvalRequired'] = entitlement['Item']['approvalRequired']
-        policy['duration'] = str(maxDuration)
-        
-        eligibility.append(policy)
 
-    return eligibility
+def with_request_context(fn):
+    # Pool workers log under the request id of the thread that submitted them
+    request_id = getattr(request_context, "request_id", None)
+
+    def run(*args):
+        request_context.request_id = request_id
+        try:
+            return fn(*args)
+        finally:
+            request_context.request_id = None
+    return run
+
+
+def batch_get(table_name, ids):
+    keys = [{'id': id} for id in dict.fromkeys(ids) if id]
+    return {item['id']: item for item in batch_get_items(table_name, keys)}
+
 
 def list_idc_group_membership(userId):
+    memberships = identity_mirror.list_group_memberships_for_member(userId)
+    if memberships is not None:
+        return memberships
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         p = client.get_paginator('list_group_memberships_for_member')
-        paginator = p.paginate(IdentityStoreId=sso_instance['IdentityStoreId'],
+        paginator = p.paginate(IdentityStoreId=get_identity_store_id(),
             MemberId={
                 'UserId': userId
             })
@@ -113,122 +88,63 @@ def list_idc_group_membership(userId):
             all_idc_groups.extend(page["GroupMemberships"])
         return all_idc_groups
     except ClientError as e:
-        print(e.response['Error']['Message'])
-        return []
+        log(e.response['Error']['Message'])
 
-def updateRequest(input):
-    session = boto3.session.Session()
-    credentials = session.get_credentials()
-    credentials = credentials.get_frozen_credentials()
-    region = session.region_name
-
-    input = input
-    query = """
-        mutation UpdateRequests(
-            $input: UpdateRequestsInput!
-            $condition: ModelRequestsConditionInput
-        ) {
-            updateRequests(input: $input, condition: $condition) {
-            id
-            email
-            accountId
-            accountName
-            role
-            roleId
-            startTime
-            duration
-            justification
-            status
-            comment
-            username
-            approver
-            approverId
-            approvers
-            approver_ids
-            revoker
-            revokerId
-            endTime
-            ticketNo
-            revokeComment
-            createdAt
-            updatedAt
-            owner
-            }
-        }
-    """
 
-    endpoint = os.environ.get('API_TEAM_GRAPHQLAPIENDPOINTOUTPUT', None)
-    headers = {"Content-Type": "application/json"}
-    payload = {"query": query, 'variables': {'input': input}}
+def load_user_group_ids(userId):
+    memberships = list_idc_group_membership(userId)
+    return None if memberships is None else [group['GroupId'] for group in memberships]
+
+def get_appsync_client():
+    # requests and the signer are only imported once a mutation is actually sent
+    global appsync_client
+    if appsync_client is None:
+        with appsync_lock:
+            if appsync_client is None:
+                from appsync import AppSyncClient
+                appsync_client = AppSyncClient(
+                    os.getenv("API_TEAM_GRAPHQLAPIENDPOINTOUTPUT"),
+                    timeout=(3.05, float(os.getenv("APPSYNC_TIMEOUT", "10"))),
+                    max_attempts=int(os.getenv("APPSYNC_MAX_ATTEMPTS", "3")),
+                    pool_size=max_workers,
+                )
+    return appsync_client
 
-    appsync_region = region
-    auth = AWSV4Sign(credentials, appsync_region, 'appsync')
 
+def updateRequest(input):
     try:
-        response = requests.post(
-            endpoint,
-            auth=auth,
-            json=payload,
-            headers=headers
-        ).json()
+        response = get_appsync_client().update_request(input)
         if 'errors' in response:
-            print('Error attempting to query AppSync')
-            print(response['errors'])
+            log('Error attempting to query AppSync')
+            log(response['errors'])
         else:
-            print(response)
+            log(response)
             return response
     except Exception as exception:
-        print('Error with Query')
-        print(exception)
+        log('Error with Query')
+        log(exception)
 
     return None
 
 
-def list_existing_sso_instances():
-    client = boto3.client('sso-admin')
-    try:
-        response = client.list_instances()
-        return response['Instances'][0]
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-
-
 def get_user(username):
-    try:
-        client = boto3.client('identitystore')
-        response = client.list_users(
-            IdentityStoreId=sso_instance['IdentityStoreId'],
-            Filters=[
-                {
-                    'AttributePath': 'UserName',
-                    'AttributeValue': username
-                },
-            ]
-        )
-        if response['Users']:
-            return response['Users'][0]['UserId']
-        else:
-            return
-    except ClientError as e:
-        print(e.response['Error']['Message'])
+    return identity_mirror.get_user_id(username) or identity_cache.get_user_id(get_identity_store_id(), username)
 
 
 def invoke_approval_sm(request, sm_arn, notification_config, team_config):
-    sfn_client = boto3.client('stepfunctions')
+    sfn_client = aws_clients.client('stepfunctions')
     try:
         response = sfn_client.start_execution(
             stateMachineArn=sm_arn,
             name=request["id"],
             input=(json.dumps({**request, **notification_config, **team_config})))
     except ClientError as e:
-        print(e.response['Error']['Message'])
+        log(e.response['Error']['Message'])
     else:
         sfn_arn = response.get('executionArn')
         return sfn_arn
 
 
-sso_instance = list_existing_sso_instances()
-
 
 def get_request_data(data, expire, approval_required):
     request = {
@@ -246,7 +162,7 @@ def get_request_data(data, expire, approval_required):
         "justification": data["justification"]["S"],
         "approver": data.get("approver", {}).get("S"),
         "revoker": data.get("revoker", {}).get("S"),
-        "instanceARN": sso_instance['InstanceArn'],
+        "instanceARN": get_instance_arn(),
         "approvers": [approver["S"] for approver in data.get("approvers", {}).get("L",[]) if approver["S"] != data.get("email", {}).get("S")],
         "expire": expire,
         "approvalRequired": approval_required
@@ -254,7 +170,7 @@ def get_request_data(data, expire, approval_required):
     return request
 
 def eligibility_error(request):
-    print("Error - Invalid Eligibility")
+    log("Error - Invalid Eligibility")
     input = {
             'id': request["id"],
             'status': 'error'
@@ -262,27 +178,26 @@ def eligibility_error(request):
     updateRequest(input)
     
 def get_eligibility(request, userId):
-    eligible = False
-    groupIds = [group['GroupId'] for group in list_idc_group_membership(userId)]
-    entitlement = getEntitlements(userId=userId, groupIds=groupIds)
-    for eligibility in entitlement:
-        if int(request["time"]) > int(eligibility["duration"]):
-            return eligibility_error(request)
-        for account in eligibility["accounts"]:
-            if request["accountId"] ==  account["id"]:
-                for permission in eligibility["permissions"]:
-                    if request["roleId"] == permission["id"]:
-                        if eligibility["approvalRequired"]:
-                            return {"approval":True}
-                        eligible = True
-    if eligible:
-        return {"approval":False}   
+    groupIds = membership_index.groups_of(userId, load_user_group_ids) or []
+    # Materialized grants answer with point reads on the requested account while they
+    # match the current policies and organization. Otherwise the version is read on
+    # every decision and a cached result is only reused while no Eligibility write or
+    # organization change has happened since
+    rows = grants.get_grants([userId] + groupIds, request["accountId"])
+    if rows is not None:
+        index = PolicyIndex(grants.to_policies(rows), request["accountId"])
+    else:
+        # Compiled once per principal set and version, and reused across decisions
+        index = get_policy_index(userId, groupIds, consistent=True)
+    decision = index.decide(request["accountId"], request["roleId"], request["time"])
+    log("Eligibility decision: %s" % json.dumps(decision))
+    if decision["eligible"]:
+        return {"approval": decision["approvalRequired"]}
     else:
-        return eligibility_error(request)          
+        return eligibility_error(request)
 
 def check_settings():
-    settings = get_settings()
-    item_settings = settings.get("Item", {})
+    item_settings = get_settings()
     approval_required = item_settings.get("approval", True)
     expiry = int(item_settings.get("expiry", 3)) * 60 * 60
     max_duration = item_settings.get("duration", "9")
@@ -310,117 +225,66 @@ def check_settings():
 def invoke_workflow(request, approval_required, notification_config, team_config):
     workflow = None
     if approval_required and request["status"] == "pending":
-        print("sending approval")
+        log("sending approval")
         workflow = approval
     elif approval_required and request["status"] == "approved" and request["email"] != request["approver"]:
-        print("scheduling session")
+        log("scheduling session")
         workflow = schedule
     elif approval_required and request["status"] == "rejected" and request["email"] != request["approver"]:
-        print("rejecting request")
+        log("rejecting request")
         workflow = reject
     elif request["status"] == "revoked":
-        print("revoking session")
+        log("revoking session")
         workflow = revoke
     elif request["status"] == "pending" and not approval_required:
-        print("scheduling session - approval not required")
+        log("scheduling session - approval not required")
         workflow = schedule
     elif request["status"] == "cancelled":
-        print("cancelling request")
+        log("cancelling request")
         workflow = reject
     elif approval_required and request["status"] in ["approved","rejected"] and request["email"] == request["approver"]:
-        print("Error: Invalid Approver")
+        log("Error: Invalid Approver")
         input = {
                 'id': request["id"],
                 'status': 'error'
                 }
         updateRequest(input)
     else:
-        print("no action")
+        log("no action")
     if workflow:
         invoke_approval_sm(request, workflow, notification_config, team_config)
 
 def get_email(username):
-    cognito = boto3.client('cognito-idp', config=Config(user_agent_extra="team-idc"))
-    next_page = None
-    kwargs = {
-        'UserPoolId': user_pool_id,
-        "Filter": f"username = \"{username}\"",
-        "AttributesToGet": [
-            "email"
-        ],
-    }
-    users_remain = True
-    while(users_remain):
-        if next_page:
-            kwargs['PaginationToken'] = next_page
-        response = cognito.list_users(**kwargs)
-        next_page = response.get('PaginationToken', None)
-        users_remain = next_page is not None
-
-    email_id = response['Users'][0]['Attributes'][0]['Value']
-    return email_id
-
-def get_ou(id):
-    client = boto3.client('organizations')
-    try:
-        response = client.list_parents(
-            ChildId=id
-        )
-        return response["Parents"][0]
-    except ClientError as e:
-        print(e.response['Error']['Message'])
+    return identity_cache.get_email(user_pool_id, username)
 
-async def getPsDuration(ps):
-    client = boto3.client('sso-admin')
-    response = client.describe_permission_set(
-    InstanceArn=sso_instance['InstanceArn'],
-    PermissionSetArn=ps
-    )
-    return response['PermissionSet']['SessionDuration']
+def getPsDuration(ps):
+    permission_set = ps_catalog.get_permission_set(ps)
+    return permission_set['Duration'] if permission_set else None
 
-def list_approvers(id):
-    try:
-        response = approver_table.get_item(
-            Key={
-                'id': id
-            }
-        )
-        if "Item" in response.keys():
-            return (response['Item']['groupIds'])
-        else:
-            return None
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-        
 def get_approver_group_ids(accountId):
+    # Approvers set on the account win, then the nearest OU up to the root
+    ids = [accountId] + [parent["Id"] for parent in org_store.get_ancestors(accountId)]
     try:
-        approvers = list_approvers(accountId)
-        if approvers:
-            return approvers
-        else:
-            ou = get_ou(accountId)
-            return(list_approvers(ou["Id"]))
+        approvers = batch_get(approver_table_name, ids)
     except ClientError as e:
-        print("no approvers for account " + accountId)
+        log(e.response['Error']['Message'])
+        return None
+    for id in ids:
+        if approvers.get(id, {}).get('groupIds'):
+            return approvers[id]['groupIds']
+    log("no approvers for account " + accountId)
 
 def get_approvers(userId):
-    client = boto3.client('identitystore')
-    response = client.describe_user(
-        IdentityStoreId=sso_instance['IdentityStoreId'],
-        UserId=userId
-    )
-    approver_id = "idc_" + response['UserName']
-    for email in response['Emails']:
-        if email:
-            approver = email["Value"]
-            break
-    return {"approver_id": approver_id, "approver": approver}
+    return identity_cache.get_approver(get_identity_store_id(), userId)
 
 def list_group_membership(groupId):
+    memberships = identity_mirror.list_group_memberships(groupId)
+    if memberships is not None:
+        return memberships
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         p = client.get_paginator('list_group_memberships')
-        paginator = p.paginate(IdentityStoreId=sso_instance['IdentityStoreId'],
+        paginator = p.paginate(IdentityStoreId=get_identity_store_id(),
         GroupId=groupId,
         )
         all_groups = []
@@ -428,35 +292,43 @@ def list_group_membership(groupId):
             all_groups.extend(page["GroupMemberships"])
         return all_groups
     except ClientError as e:
-        print(e.response['Error']['Message'])
+        log(e.response['Error']['Message'])
         
-async def get_approvers_details(accountId):
+def load_group_member_ids(groupId):
+    memberships = list_group_membership(groupId)
+    if memberships is None:
+        return None
+    return [result["MemberId"]["UserId"] for result in memberships if "UserId" in result.get("MemberId", {})]
+
+def get_approvers_details(accountId):
     approver_groups = get_approver_group_ids(accountId)
     approvers = []
     approver_ids = []
     if approver_groups:
-        for group in approver_groups:
-            approvers_data = [get_approvers(result["MemberId"]["UserId"])
-                for result in list_group_membership(group)]
+        user_ids = membership_index.members_of_any(approver_groups, load_group_member_ids)
+        if user_ids:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(user_ids))) as executor:
+                approvers_data = list(executor.map(with_request_context(get_approvers), user_ids))
             for data in approvers_data:
-                if data["approver"] not in approvers:
+                if data and data["approver"] and data["approver"] not in approvers:
                     approvers.append(data["approver"])
                     approver_ids.append(data["approver_id"].lower())
     return {"approvers":approvers, "approver_ids":approver_ids}
 
-async def updateRequestDetails(request_id, username, accountId, roleId):
-    email = get_email(username)
-    approver_details = await get_approvers_details(accountId)
-    approver_ids = approver_details["approver_ids"]
-    approvers = approver_details["approvers"]
-    session_duration = await getPsDuration(roleId)
+def updateRequestDetails(request_id, username, accountId, roleId):
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        email = executor.submit(with_request_context(get_email), username)
+        approver_details = executor.submit(with_request_context(get_approvers_details), accountId)
+        session_duration = executor.submit(with_request_context(getPsDuration), roleId)
+    approver_ids = approver_details.result()["approver_ids"]
+    approvers = approver_details.result()["approvers"]
     
     input = {
         'id': request_id,
-        'email': email,
+        'email': email.result(),
         'approvers': approvers,
         'approver_ids': approver_ids,
-        'session_duration': session_duration        
+        'session_duration': session_duration.result()
     }
     
     updateRequest(input)
@@ -482,8 +354,8 @@ def request_is_updated(status,data,username,request_id):
     if status in ["error", "ended"]:
         return updated
     elif status == "pending" and "email" not in data.keys():
-        asyncio.run(updateRequestDetails(request_id, username, data["accountId"]["S"], data["roleId"]["S"]))
-        print("updating request details")
+        updateRequestDetails(request_id, username, data["accountId"]["S"], data["roleId"]["S"])
+        log("updating request details")
     elif status in ["approved","rejected"] and "approver" not in data.keys():
         updateApproverDetails(request_id,data["approverId"]["S"])
     elif status == "revoked" and "revoker" not in data.keys():
@@ -492,9 +364,8 @@ def request_is_updated(status,data,username,request_id):
         updated = True
     return updated
 
-def handler(event, context):
-    data = event["Records"].pop()["dynamodb"]["NewImage"]
-    print("Checking if request is updated")
+def process_request(data):
+    log("Checking if request is updated")
     status = data["status"]["S"]
     username = data["username"]["S"]
     request_id = data["id"]["S"]
@@ -505,13 +376,13 @@ def handler(event, context):
         expiry_time = settings["expiry"]
         request = get_request_data(data, expiry_time, approval_required)
         if int(request["time"]) > int(settings["max_duration"]):
-            print("Error: Invalid Duration")
+            log("Error: Invalid Duration")
             input = {
                     'id': request["id"],
                     'status': 'error'
                     }
             return updateRequest(input)
-        print("Received event: %s" % json.dumps(request))
+        log("Received event: %s" % json.dumps(request))
         userId = get_user((data["username"]["S"])[4:])
         request["userId"] = userId
         eligible = get_eligibility(request, userId)
@@ -521,5 +392,43 @@ def handler(event, context):
                 request["approvalRequired"] = eligible["approval"]
             invoke_workflow(request, approval_required, notification_config, team_config)
     else:
-        print("Request not updated")
-        
\ No newline at end of file
+        log("Request not updated")
+
+def process_records(records):
+    # Records for the same request are handled in stream order. Once one fails,
+    # the remaining records are reported as failed too so they are retried in order.
+    failures = []
+    request_context.request_id = records[0]["dynamodb"]["Keys"]["id"]["S"]
+    try:
+        for record in records:
+            sequence_number = record["dynamodb"]["SequenceNumber"]
+            if failures:
+                failures.append(sequence_number)
+                continue
+            data = record["dynamodb"].get("NewImage")
+            if not data:
+                continue
+            try:
+                process_request(data)
+            except Exception as e:
+                log(f"Error processing record {sequence_number}: {e}")
+                failures.append(sequence_number)
+    finally:
+        request_context.request_id = None
+    return failures
+
+def handler(event, context):
+    # Memberships indexed before the mirror's last completed sync are dropped
+    membership_index.revalidate(identity_mirror.get_completed_at())
+    records_by_request = {}
+    for record in event.get("Records", []):
+        request_id = record["dynamodb"]["Keys"]["id"]["S"]
+        records_by_request.setdefault(request_id, []).append(record)
+
+    batch_item_failures = []
+    if records_by_request:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(records_by_request))) as executor:
+            for failures in executor.map(process_records, records_by_request.values()):
+                batch_item_failures.extend(
+                    {"itemIdentifier": sequence_number} for sequence_number in failures)
+    return {"batchItemFailures": batch_item_failures}
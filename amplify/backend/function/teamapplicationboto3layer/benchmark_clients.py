@@ -0,0 +1,103 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares the client construction of each handler before and after the shared
+clients of aws_clients. The helpers that built a boto3 client or resource on
+every call are read from each function's src/index.py at a baseline revision,
+an invocation calls each of them once. Creating a client makes no AWS calls.
+Run from this directory, in a git checkout, with boto3 installed:
+
+    python benchmark_clients.py --invocations 20
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(HERE, "lib", "python"))
+
+import boto3  # noqa: E402
+import aws_clients  # noqa: E402
+
+FUNCTIONS = "amplify/backend/function"
+
+
+def git(*args):
+    top = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=HERE, text=True).strip()
+    return subprocess.check_output(["git", *args], cwd=top, text=True)
+
+
+def helpers(revision):
+    """handler -> [(helper, "client" or "resource", service)] for every function
+    of revision that called boto3.client or boto3.resource inside a function."""
+    found = {}
+    for path in git("ls-tree", "-r", "--name-only", revision, FUNCTIONS).split():
+        if not path.endswith("/src/index.py"):
+            continue
+        module = ast.parse(git("show", f"{revision}:{path}"))
+        calls = []
+        for node in module.body:
+            if not isinstance(node, ast.FunctionDef):
+                continue
+            for call in ast.walk(node):
+                if (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute)
+                        and isinstance(call.func.value, ast.Name) and call.func.value.id == "boto3"
+                        and call.func.attr in ("client", "resource")
+                        and call.args and isinstance(call.args[0], ast.Constant)):
+                    calls.append((node.name, call.func.attr, call.args[0].value))
+        if calls:
+            found[path.split("/")[-3]] = calls
+    return found
+
+
+def per_call(kind, service):
+    # Before: a new client, and its endpoint and model resolution, on every helper call
+    return getattr(boto3, kind)(service)
+
+
+def shared(kind, service):
+    # After: one client per service and region for the life of the container
+    return getattr(aws_clients, kind)(service)
+
+
+def measure(get, calls, invocations):
+    started = time.perf_counter()
+    for _ in range(invocations):
+        for _, kind, service in calls:
+            get(kind, service)
+    return (time.perf_counter() - started) / invocations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", default=None,
+                        help="revision to read the helpers from, the root commit by default")
+    parser.add_argument("--invocations", type=int, default=20)
+    args = parser.parse_args()
+
+    baseline = args.baseline or git("rev-list", "--max-parents=0", "HEAD").split()[0]
+    print(f"helpers from {baseline[:7]}, ms for the first invocation of a container and per warm "
+          f"invocation over {args.invocations}")
+    print(f"{'handler':<26} {'helpers':>7} {'cold':>8} {'warm':>8} {'cold':>8} {'warm':>8}")
+    print(f"{'':<26} {'':>7} {'per call':>17} {'shared':>17}")
+    for handler, calls in sorted(helpers(baseline).items()):
+        # A new container: fresh sessions, service models are loaded on first use
+        boto3.DEFAULT_SESSION = None
+        aws_clients.session = boto3.session.Session()
+        aws_clients.clients.clear()
+        aws_clients.resources.clear()
+        results = []
+        for get in (per_call, shared):
+            results += [measure(get, calls, 1), measure(get, calls, args.invocations)]
+        print(f"{handler:<26} {len(calls):>7} " + " ".join(f"{result * 1000:>8.3f}" for result in results))
+        services = sorted({f"{service} {kind}" for _, kind, service in calls})
+        print(f"{'':<26} {', '.join(services)}")
+
+
+if __name__ == "__main__":
+    main()
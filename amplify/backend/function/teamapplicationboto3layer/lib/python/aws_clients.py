@@ -0,0 +1,49 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import threading
+import boto3
+from botocore.config import Config
+
+client_config = Config(
+    user_agent_extra="team-idc",
+    max_pool_connections=int(os.getenv("CLIENT_MAX_POOL_CONNECTIONS", "50")),
+    connect_timeout=float(os.getenv("CLIENT_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("CLIENT_READ_TIMEOUT", "30")),
+    retries={
+        "mode": os.getenv("CLIENT_RETRY_MODE", "adaptive"),
+        "max_attempts": int(os.getenv("CLIENT_MAX_ATTEMPTS", "8")),
+    },
+)
+
+# Clients are thread safe once created, but creating them from a shared session is not
+session = boto3.session.Session()
+clients = {}
+resources = {}
+lock = threading.Lock()
+
+
+def client(service_name, region_name=None):
+    key = (service_name, region_name)
+    service_client = clients.get(key)
+    if service_client is None:
+        with lock:
+            service_client = clients.get(key)
+            if service_client is None:
+                service_client = session.client(service_name, region_name=region_name, config=client_config)
+                clients[key] = service_client
+    return service_client
+
+
+def resource(service_name, region_name=None):
+    key = (service_name, region_name)
+    service_resource = resources.get(key)
+    if service_resource is None:
+        with lock:
+            service_resource = resources.get(key)
+            if service_resource is None:
+                service_resource = session.resource(service_name, region_name=region_name, config=client_config)
+                resources[key] = service_resource
+    return service_resource
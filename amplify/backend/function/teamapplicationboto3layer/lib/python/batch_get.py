@@ -0,0 +1,38 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import random
+import time
+import aws_clients
+
+batch_get_max_attempts = int(os.getenv("BATCH_GET_MAX_ATTEMPTS", "8"))
+# BatchGetItem accepts at most 100 keys per call
+BATCH_SIZE = 100
+
+
+class UnprocessedKeysError(Exception):
+    """Raised when keys are still unprocessed after every attempt. A partial result
+    is never returned, callers either fail or fall back to another source."""
+
+
+def batch_get_items(table_name, keys, attempts=None, **options):
+    """All items of table_name found for keys, in no particular order. Unprocessed
+    keys are retried with jittered exponential backoff. options are added to the
+    table's request, e.g. ConsistentRead or ProjectionExpression."""
+    attempts = attempts or batch_get_max_attempts
+    items = []
+    dynamodb = aws_clients.resource('dynamodb')
+    for i in range(0, len(keys), BATCH_SIZE):
+        request = {table_name: {'Keys': keys[i:i + BATCH_SIZE], **options}}
+        for attempt in range(attempts):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(table_name, []))
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            time.sleep(random.uniform(0, min(1, 0.05 * 2 ** attempt)))
+        if request:
+            raise UnprocessedKeysError(f"Unable to read {table_name}, unprocessed keys remain")
+    return items
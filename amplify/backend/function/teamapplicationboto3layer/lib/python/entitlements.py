@@ -0,0 +1,239 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+import aws_clients
+from batch_get import batch_get_items
+from botocore.exceptions import ClientError
+from instance_config import get_mgmt_account_id
+import org_store
+import ou_cache
+from policy_engine import PolicyIndex, entitlement_matrix
+from ttl_cache import TTLCache, MISSING
+
+# Eligibility policies of a user and its groups resolved into the accounts and
+# permission sets they grant, shared by getEntitlement, the login bootstrap and
+# the request router
+policy_table_name = os.getenv("POLICY_TABLE_NAME")
+ACCOUNT_ID = os.getenv("ACCOUNT_ID")
+cache_table_name = os.getenv("CACHE_TABLE_NAME")
+
+# Resolved policies are cached per principal set in the container and in the cache
+# table, tagged with the eligibility version. The version is bumped from the
+# Eligibility table stream and on organization changes, which makes every cached
+# result stale at once.
+entitlement_cache_ttl = int(os.getenv("ENTITLEMENT_CACHE_TTL", "300"))
+entitlement_cache_max_entries = int(os.getenv("ENTITLEMENT_CACHE_MAX_ENTRIES", "256"))
+# How long a container trusts the version it last read
+entitlement_version_ttl = int(os.getenv("ENTITLEMENT_VERSION_TTL", "10"))
+VERSION_KEY = {'id': 'entitlements#version'}
+# DynamoDB items are limited to 400 KB, larger results are only cached in the container
+MAX_CACHE_ITEM_BYTES = 350 * 1024
+
+resolved = TTLCache(entitlement_cache_ttl, entitlement_cache_max_entries)
+versions = TTLCache(entitlement_version_ttl, 1)
+# Eligibility version this container's OU expansions were last invalidated for
+expanded_version = None
+expanded_lock = threading.Lock()
+
+
+def list_account_for_ous(ou_ids, version=None):
+    mgmt_account_id = get_mgmt_account_id()
+    deployed_in_mgmt = True if ACCOUNT_ID == mgmt_account_id else False
+    ou_accounts = ou_cache.list_accounts_for_ous(ou_ids, version)
+    if not deployed_in_mgmt:
+        for ou_id, accounts in ou_accounts.items():
+            ou_accounts[ou_id] = [acct for acct in accounts if acct['id'] != mgmt_account_id]
+    return ou_accounts
+
+
+def get_policies(ids):
+    """Eligibility items of ids in the order of ids, principals without a policy are
+    left out. Raises UnprocessedKeysError rather than returning a partial read, which
+    would drop grants and could end up cached."""
+    ids = list(dict.fromkeys(id for id in ids if id))
+    items = {item['id']: item for item in batch_get_items(policy_table_name, [{'id': id} for id in ids])}
+    return [items[id] for id in ids if id in items]
+
+
+def expand(policies, ou_accounts):
+    """Copies of policies with their OUs expanded into accounts, each account listed
+    once. The stored items are left untouched so cached copies stay valid."""
+    resolved = []
+    for item in policies:
+        accounts = {}
+        for account in item['accounts']:
+            accounts.setdefault(account['id'], account)
+        for ou in item['ous']:
+            for account in ou_accounts.get(ou['id'], []):
+                accounts.setdefault(account['id'], account)
+        resolved.append({**item, 'accounts': list(accounts.values())})
+    return resolved
+
+
+def resolve_policies(user_id, group_ids, version=None):
+    policies = get_policies([user_id] + list(group_ids or []))
+    ou_accounts = list_account_for_ous(
+        [ou["id"] for item in policies for ou in item["ous"]], version)
+    return expand(policies, ou_accounts)
+
+
+def invalidate_ou_caches(version):
+    """Drops this container's OU expansions the first time it resolves at version,
+    they may predate the organization change that bumped it. Entries loaded after
+    that are current for the version."""
+    global expanded_version
+    with expanded_lock:
+        if version == expanded_version:
+            return
+        expanded_version = version
+    ou_cache.invalidate()
+    org_store.invalidate()
+
+
+def get_cache_table():
+    return aws_clients.resource('dynamodb').Table(cache_table_name)
+
+
+def cache_key(user_id, group_ids):
+    group_ids = sorted(set(id for id in group_ids or [] if id))
+    digest = hashlib.sha256("\n".join(group_ids).encode()).hexdigest()[:32]
+    return f"entitlements#{user_id}#{digest}"
+
+
+def read_version():
+    try:
+        item = get_cache_table().get_item(Key=VERSION_KEY).get("Item") or {}
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    return int(item.get('version', 0))
+
+
+def get_version(consistent=False):
+    """Current eligibility version, None when it cannot be read and results must
+    not be cached. consistent skips the container's copy of the version."""
+    if not cache_table_name:
+        return 0
+    version = MISSING if consistent else versions.get("version")
+    if version is MISSING:
+        version = read_version()
+        if version is None:
+            return None
+        versions.set("version", version)
+    return version
+
+
+def bump_version():
+    # Errors propagate, so a stream batch or Organizations event whose bump failed is
+    # retried instead of leaving cached entitlements current until their TTL
+    response = get_cache_table().update_item(
+        Key=VERSION_KEY,
+        UpdateExpression="ADD version :one",
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues="UPDATED_NEW"
+    )
+    versions.invalidate()
+    resolved.invalidate()
+    version = int(response['Attributes']['version'])
+    print(f"Eligibility version bumped to {version}")
+    return version
+
+
+def read_cache_table(key, version):
+    try:
+        item = get_cache_table().get_item(Key={'id': key}).get("Item")
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    if not item or int(item['version']) != version or int(item['expireAt']) <= time.time():
+        return None
+    return json.loads(zlib.decompress(item['policies'].value))
+
+
+def write_cache_table(key, version, policies):
+    data = zlib.compress(json.dumps(policies, separators=(',', ':')).encode())
+    if len(data) > MAX_CACHE_ITEM_BYTES:
+        return
+    try:
+        get_cache_table().put_item(Item={
+            'id': key,
+            'version': version,
+            'policies': data,
+            'expireAt': int(time.time()) + entitlement_cache_ttl,
+        })
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+
+
+def resolved_entry(user_id, group_ids, consistent):
+    version = get_version(consistent)
+    if version is None:
+        return {'policies': resolve_policies(user_id, group_ids)}
+    key = cache_key(user_id, group_ids)
+    cached = resolved.get(key)
+    if cached is not MISSING and cached['version'] == version:
+        return cached
+    policies = read_cache_table(key, version) if cache_table_name else None
+    if policies is None:
+        invalidate_ou_caches(version)
+        policies = resolve_policies(user_id, group_ids, version)
+        if cache_table_name:
+            write_cache_table(key, version, policies)
+    entry = {'version': version, 'policies': policies}
+    resolved.set(key, entry)
+    return entry
+
+
+def get_resolved_policies(user_id, group_ids, consistent=False):
+    """resolve_policies through the container and cache table tiers. Results are
+    shared between callers and must not be modified."""
+    return resolved_entry(user_id, group_ids, consistent)['policies']
+
+
+def get_policy_index(user_id, group_ids, consistent=False):
+    """PolicyIndex of get_resolved_policies, compiled once and kept in the container
+    next to the policies it was compiled from, under the same key and version."""
+    entry = resolved_entry(user_id, group_ids, consistent)
+    index = entry.get('index')
+    if index is None:
+        # Concurrent callers may both compile, either index is equivalent
+        index = entry['index'] = PolicyIndex(entry['policies'])
+    return index
+
+
+def to_entitlements(policies):
+    eligibility = []
+    maxDuration = 0
+    for item in policies:
+        duration = item['duration']
+        if int(duration) > maxDuration:
+            maxDuration = int(duration)
+        policy = {}
+        policy['accounts'] = item['accounts']
+        policy['permissions'] = item['permissions']
+        policy['approvalRequired'] = item['approvalRequired']
+        policy['duration'] = str(maxDuration)
+        eligibility.append(policy)
+    return eligibility
+
+
+def to_matrix(policies):
+    return entitlement_matrix(policies)
+
+
+def get_entitlements(user_id, group_ids):
+    """One entry per matching policy, the shape of getEntitlement."""
+    return to_entitlements(get_resolved_policies(user_id, group_ids))
+
+
+def get_entitlement_matrix(user_id, group_ids):
+    """Each account and permission set once, with approval and maximum duration per
+    granted account and permission set pair, the shape of getEntitlementMatrix."""
+    return to_matrix(get_resolved_policies(user_id, group_ids))
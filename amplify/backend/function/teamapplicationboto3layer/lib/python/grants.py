@@ -0,0 +1,315 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import aws_clients
+from batch_get import batch_get_items, UnprocessedKeysError
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+import org_store
+import ou_cache
+from entitlements import expand, list_account_for_ous, policy_table_name
+
+# Eligibility policies materialized at write time into one row per principal and
+# account, OUs already expanded, so eligibility checks are point reads whose cost
+# does not depend on OU size. Rows:
+#   principalId=<user or group id>  accountId=<account id>  permissions, approvalRequired,
+#                                                           duration, policyName, stamp
+#   principalId=<user or group id>  accountId=#policy       stamp of the last complete write
+#   principalId=#state              accountId=org           org version, bumped on organization changes
+#   principalId=#state              accountId=materialized  time of the last full build
+# A stamp is the policy's updatedAt and the org version the OUs were expanded at.
+# Writes are conditional on the stamp, so a slower writer holding an older policy or
+# organization never overwrites a newer one. Rows are rewritten from the Eligibility
+# table stream for the changed policy, for every policy with OUs after an
+# organization change, and in full by the scheduled org store crawl.
+grants_table_name = os.getenv("GRANTS_TABLE_NAME")
+grants_max_workers = int(os.getenv("GRANTS_MAX_WORKERS", "8"))
+MARKER = '#policy'
+STATE = '#state'
+STATE_KEY = {'principalId': STATE, 'accountId': 'materialized'}
+ORG_VERSION_KEY = {'principalId': STATE, 'accountId': 'org'}
+FIELDS = ('permissions', 'approvalRequired', 'duration', 'policyName', 'policyUpdatedAt', 'orgVersion')
+
+deserializer = TypeDeserializer()
+
+
+def enabled():
+    return bool(grants_table_name)
+
+
+def get_table():
+    return aws_clients.resource('dynamodb').Table(grants_table_name)
+
+
+def now():
+    # Same format as the updatedAt Amplify sets on Eligibility items
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+# Reads
+
+
+def fresh(stamped, policy, org_version):
+    # Rows of policies without OUs do not depend on the organization
+    return (
+        stamped.get('policyUpdatedAt') == policy['updatedAt']
+        and (not policy.get('ous') or int(stamped.get('orgVersion', -1)) == org_version)
+    )
+
+
+def get_grants(principal_ids, account_id):
+    """Rows granting account_id to any of principal_ids, None when any of them may be
+    out of date and the caller should resolve policies instead. Rows are only used
+    when the principal's marker carries the stamp of its current policy, which is
+    written after all of the principal's rows."""
+    if not enabled():
+        return None
+    principal_ids = list(dict.fromkeys(id for id in principal_ids if id))
+    try:
+        policies = batch_get_items(
+            policy_table_name, [{'id': id} for id in principal_ids],
+            ConsistentRead=True, ProjectionExpression='id, updatedAt, ous')
+        if any(not policy.get('updatedAt') for policy in policies):
+            return None
+        markers = batch_get_items(
+            grants_table_name,
+            [ORG_VERSION_KEY] + [{'principalId': policy['id'], 'accountId': MARKER} for policy in policies],
+            ConsistentRead=True)
+        org_version = next((int(item['version']) for item in markers if item['principalId'] == STATE), 0)
+        markers = {item['principalId']: item for item in markers if item['principalId'] != STATE}
+        if any(policy['id'] not in markers or not fresh(markers[policy['id']], policy, org_version)
+               for policy in policies):
+            return None
+        # Read after the markers, so rows of the marked write are visible
+        rows = batch_get_items(
+            grants_table_name, [{'principalId': policy['id'], 'accountId': account_id} for policy in policies],
+            ConsistentRead=True)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    except UnprocessedKeysError as e:
+        print(e)
+        return None
+    # A row from another write than the marked one means a writer is in progress
+    marker_stamps = {id: (marker['policyUpdatedAt'], marker.get('orgVersion')) for id, marker in markers.items()}
+    if any((row.get('policyUpdatedAt'), row.get('orgVersion')) != marker_stamps[row['principalId']] for row in rows):
+        return None
+    return rows
+
+
+def to_policies(rows):
+    # Same shape as resolved policies, restricted to the row's account
+    return [
+        {
+            'id': row['principalId'],
+            'name': row.get('policyName'),
+            'accounts': [{'id': row['accountId']}],
+            'permissions': row['permissions'],
+            'approvalRequired': row['approvalRequired'],
+            'duration': row['duration'],
+        }
+        for row in rows
+    ]
+
+
+# Writes
+
+
+def get_org_version():
+    item = get_table().get_item(Key=ORG_VERSION_KEY, ConsistentRead=True).get("Item") or {}
+    return int(item.get('version', 0))
+
+
+def bump_org_version():
+    # Every row expanded from OUs becomes stale until it is written again at the new version
+    response = get_table().update_item(
+        Key=ORG_VERSION_KEY,
+        UpdateExpression="ADD version :one",
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues="UPDATED_NEW"
+    )
+    return int(response['Attributes']['version'])
+
+
+def stamp_condition(updated_at, org_version=None):
+    """Only replaces rows stamped with an older policy, or the same policy expanded
+    at an older or the same org version. Without org_version, rows of any org
+    version up to updated_at."""
+    stamp = Attr('policyUpdatedAt')
+    if org_version is None:
+        return stamp.not_exists() | stamp.lte(updated_at)
+    return stamp.not_exists() | stamp.lt(updated_at) | (stamp.eq(updated_at) & Attr('orgVersion').lte(org_version))
+
+
+def conditional(write, **kwargs):
+    # False when a newer writer got there first
+    try:
+        write(**kwargs)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def rows_for(policy, org_version):
+    return [
+        {
+            'principalId': policy['id'],
+            'accountId': account['id'],
+            'permissions': policy['permissions'],
+            'approvalRequired': policy['approvalRequired'],
+            'duration': policy['duration'],
+            'policyName': policy.get('name'),
+            'policyUpdatedAt': policy.get('updatedAt') or '',
+            'orgVersion': org_version,
+        }
+        for account in policy['accounts']
+    ]
+
+
+def query_principal(principal_id):
+    kwargs = {'KeyConditionExpression': Key('principalId').eq(principal_id), 'ConsistentRead': True}
+    rows = []
+    table = get_table()
+    while True:
+        response = table.query(**kwargs)
+        rows.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return rows
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def changed(existing, row):
+    return not existing or any(existing.get(field) != row[field] for field in FIELDS)
+
+
+def superseded(stamped, updated_at, org_version=None):
+    # The same rule as stamp_condition, for the marker already read
+    stamp = (stamped.get('policyUpdatedAt', ''), stamped.get('orgVersion', -1))
+    return stamp[0] > updated_at or (org_version is not None and stamp[0] == updated_at and stamp[1] > org_version)
+
+
+def write_principal(principal_id, rows, condition, marker, updated_at, org_version=None):
+    """Writes the rows that changed and deletes the principal's other rows, then the
+    marker, each only where condition holds. marker None deletes the marker. Nothing
+    is written when a newer write has already completed."""
+    table = get_table()
+    existing = {row['accountId']: row for row in query_principal(principal_id)}
+    current = existing.pop(MARKER, None)
+    if current and superseded(current, updated_at, org_version):
+        return 0
+    written = [row for row in rows if changed(existing.get(row['accountId']), row)]
+    wanted = {row['accountId'] for row in rows}
+    removed = [account_id for account_id in existing if account_id not in wanted]
+    applied = 0
+    for row in written:
+        applied += conditional(table.put_item, Item=row, ConditionExpression=condition)
+    for account_id in removed:
+        applied += conditional(table.delete_item, Key={'principalId': principal_id, 'accountId': account_id},
+                               ConditionExpression=condition)
+    key = {'principalId': principal_id, 'accountId': MARKER}
+    if marker is None:
+        conditional(table.delete_item, Key=key, ConditionExpression=condition)
+    else:
+        conditional(table.put_item, Item={**key, **marker}, ConditionExpression=condition)
+    return applied
+
+
+def materialize(items, removed=(), org_version=None):
+    """Rewrites the rows of the given Eligibility items, expanded at org_version (the
+    current one by default), and deletes the rows of removed (principal id, updatedAt
+    of the deleted item) pairs. Only rows that changed are written."""
+    if org_version is None:
+        org_version = get_org_version()
+    # Placement is read again after the org version, never from this container's copy
+    ou_cache.invalidate()
+    org_store.invalidate()
+    # Unset list attributes come back as null
+    items = [{**item, 'accounts': item.get('accounts') or [], 'ous': item.get('ous') or []} for item in items]
+    ou_accounts = list_account_for_ous([ou["id"] for item in items for ou in item["ous"]])
+    policies = expand(items, ou_accounts)
+
+    def write_policy(policy):
+        updated_at = policy.get('updatedAt') or ''
+        return write_principal(
+            policy['id'], rows_for(policy, org_version), stamp_condition(updated_at, org_version),
+            {'policyUpdatedAt': updated_at, 'orgVersion': org_version}, updated_at, org_version)
+
+    def write_removed(entry):
+        principal_id, updated_at = entry
+        return write_principal(principal_id, [], stamp_condition(updated_at), None, updated_at)
+
+    with ThreadPoolExecutor(max_workers=grants_max_workers) as executor:
+        written = sum(executor.map(write_policy, policies)) + sum(executor.map(write_removed, removed))
+    print(f"Grants: {written} rows written for {len(policies)} policies, {len(removed)} removed at org version {org_version}")
+    return written
+
+
+def apply_stream(records):
+    """Applies Eligibility table stream records."""
+    items = {}
+    removed = {}
+    for record in records:
+        key = record['dynamodb']['Keys']['id']['S']
+        if record['eventName'] != "REMOVE":
+            image = record['dynamodb']['NewImage']
+            items[key] = {name: deserializer.deserialize(value) for name, value in image.items()}
+            removed.pop(key, None)
+        else:
+            image = record['dynamodb'].get('OldImage') or {}
+            items.pop(key, None)
+            removed[key] = deserializer.deserialize(image['updatedAt']) if 'updatedAt' in image else now()
+    return materialize(list(items.values()), list(removed.items()))
+
+
+def scan_policies():
+    items = []
+    kwargs = {'ConsistentRead': True}
+    table = aws_clients.resource('dynamodb').Table(policy_table_name)
+    while True:
+        response = table.scan(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def scan_principals():
+    principals = set()
+    kwargs = {'ProjectionExpression': 'principalId'}
+    table = get_table()
+    while True:
+        response = table.scan(**kwargs)
+        principals.update(row['principalId'] for row in response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return principals - {STATE}
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def refresh_ous():
+    """Re-expands every policy that grants OUs, after the organization changed."""
+    if not enabled():
+        return None
+    org_version = bump_org_version()
+    return materialize([item for item in scan_policies() if item.get('ous')], org_version=org_version)
+
+
+def rebuild():
+    if not enabled():
+        return None
+    # The crawl may have found placement changes no event reported
+    org_version = bump_org_version()
+    # Rows of principals whose policy was created after the scan are kept
+    started_at = now()
+    items = scan_policies()
+    removed = [(id, started_at) for id in scan_principals() - {item['id'] for item in items}]
+    written = materialize(items, removed, org_version)
+    get_table().put_item(Item={**STATE_KEY, 'builtAt': int(time.time())})
+    return written
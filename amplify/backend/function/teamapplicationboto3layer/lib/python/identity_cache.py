@@ -0,0 +1,78 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import aws_clients
+from botocore.exceptions import ClientError
+from ttl_cache import TTLCache, MISSING
+
+identity_cache_ttl = int(os.getenv("IDENTITY_CACHE_TTL", "900"))
+identity_cache_negative_ttl = int(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "60"))
+identity_cache_max_entries = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "4096"))
+
+user_ids = TTLCache(identity_cache_ttl, identity_cache_max_entries)
+emails = TTLCache(identity_cache_ttl, identity_cache_max_entries)
+approvers = TTLCache(identity_cache_ttl, identity_cache_max_entries)
+
+NOT_FOUND_ERRORS = ("ResourceNotFoundException", "UserNotFoundException")
+
+
+def cached_lookup(cache, key, lookup):
+    # Missing principals are cached for a shorter time, errors are not cached at all
+    value = cache.get(key)
+    if value is not MISSING:
+        return value
+    try:
+        value = lookup()
+    except ClientError as e:
+        if e.response['Error']['Code'] not in NOT_FOUND_ERRORS:
+            print(e.response['Error']['Message'])
+            return None
+        print(f"{key[-1]} not found: {e.response['Error']['Message']}")
+        value = None
+    cache.set(key, value, identity_cache_ttl if value is not None else identity_cache_negative_ttl)
+    return value
+
+
+def get_user_id(identity_store_id, username):
+    def lookup():
+        response = aws_clients.client('identitystore').get_user_id(
+            IdentityStoreId=identity_store_id,
+            AlternateIdentifier={
+                'UniqueAttribute': {
+                    'AttributePath': 'UserName',
+                    'AttributeValue': username
+                }
+            }
+        )
+        return response['UserId']
+    return cached_lookup(user_ids, (identity_store_id, username), lookup)
+
+
+def get_email(user_pool_id, username):
+    def lookup():
+        response = aws_clients.client('cognito-idp').admin_get_user(
+            UserPoolId=user_pool_id,
+            Username=username
+        )
+        for attribute in response['UserAttributes']:
+            if attribute['Name'] == 'email':
+                return attribute['Value']
+        return None
+    return cached_lookup(emails, (user_pool_id, username), lookup)
+
+
+def get_approver(identity_store_id, user_id):
+    def lookup():
+        response = aws_clients.client('identitystore').describe_user(
+            IdentityStoreId=identity_store_id,
+            UserId=user_id
+        )
+        approver = None
+        for email in response.get('Emails', []):
+            if email:
+                approver = email["Value"]
+                break
+        return {"approver_id": "idc_" + response['UserName'], "approver": approver}
+    return cached_lookup(approvers, (identity_store_id, user_id), lookup)
@@ -0,0 +1,341 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import time
+import aws_clients
+from batch_get import batch_get_items, UnprocessedKeysError
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from instance_config import get_identity_store_id
+from ttl_cache import TTLCache, MISSING
+
+# Users, groups and memberships of the identity store mirrored in the identity
+# mirror table by a scheduled, resumable sync. Items:
+#   pk=user#<id>            sk=meta#<id>    user and its UserName
+#   pk=username#<name>      sk=user#<id>    UserName -> UserId
+#   pk=group#<id>           sk=meta#<id>    group and its DisplayName
+#   pk=groupname#<name>     sk=group#<id>   DisplayName -> GroupId
+#   pk=groups               sk=group#<id>   group and the start of the last cycle that saw it
+#   pk=group#<id>           sk=user#<id>    membership (group -> users, and users ->
+#                                           groups through the inverted index)
+#   pk=sync                 sk=checkpoint   sync progress
+# The inverted index is keyed on sk, so meta items carry their id in sk rather than
+# sharing one index partition. The identity store has no change feed, so deletions
+# are not observed directly: every item carries an expireAt that the sync pushes
+# forward while the entry still exists, and readers ignore expired items until
+# DynamoDB removes them. Groups a completed cycle did not see are deleted at once,
+# with their memberships.
+identity_mirror_table_name = os.getenv("IDENTITY_MIRROR_TABLE_NAME")
+identity_mirror_item_ttl = int(os.getenv("IDENTITY_MIRROR_ITEM_TTL", str(3 * 86400)))
+# Readers fall back to the identity store when the last full sync is older than this
+identity_mirror_max_staleness = int(os.getenv("IDENTITY_MIRROR_MAX_STALENESS", "3600"))
+identity_mirror_cache_ttl = int(os.getenv("IDENTITY_MIRROR_CACHE_TTL", "30"))
+INVERTED_INDEX = "inverted"
+CHECKPOINT_KEY = {'pk': 'sync', 'sk': 'checkpoint'}
+META = "meta#"
+GROUPS_PK = "groups"
+PHASES = ("users", "groups", "memberships")
+
+cache = TTLCache(identity_mirror_cache_ttl, 1)
+
+
+def enabled():
+    return bool(identity_mirror_table_name)
+
+
+def get_table():
+    return aws_clients.resource('dynamodb').Table(identity_mirror_table_name)
+
+
+def live(item, now=None):
+    return int(item.get('expireAt', 0)) > (now or time.time())
+
+
+# Readers, all return None when the mirror cannot answer and the caller should
+# ask the identity store instead
+
+
+def get_checkpoint():
+    return get_table().get_item(Key=CHECKPOINT_KEY).get("Item")
+
+
+def get_completed_at():
+    """Time the last full sync cycle completed, 0 when none has or it cannot be read."""
+    if not enabled():
+        return 0
+
+    def load(key):
+        try:
+            checkpoint = get_checkpoint() or {}
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return 0
+        return int(checkpoint.get('completedAt') or 0)
+    return cache.get_or_load("completedAt", load)
+
+
+def ready():
+    return enabled() and time.time() - get_completed_at() < identity_mirror_max_staleness
+
+
+def query(pk, prefix=None, index=None):
+    if index:
+        condition = Key('sk').eq(pk)
+        if prefix:
+            condition = condition & Key('pk').begins_with(prefix)
+    else:
+        condition = Key('pk').eq(pk)
+        if prefix:
+            condition = condition & Key('sk').begins_with(prefix)
+    kwargs = {'KeyConditionExpression': condition}
+    if index:
+        kwargs['IndexName'] = index
+    now = time.time()
+    items = []
+    table = get_table()
+    while True:
+        response = table.query(**kwargs)
+        items.extend(item for item in response['Items'] if live(item, now))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def read(lookup):
+    if not ready():
+        return None
+    try:
+        return lookup()
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+
+
+def strip(key, prefix):
+    return key[len(prefix):]
+
+
+def newest(items):
+    # A renamed entry leaves its old alias behind until it expires
+    return max(items, key=lambda item: int(item['expireAt']))
+
+
+def get_user_id(username):
+    def lookup():
+        items = query("username#" + username, "user#")
+        return strip(newest(items)['sk'], "user#") if items else MISSING
+    user_id = read(lookup)
+    return None if user_id is MISSING else user_id
+
+
+def get_group_id(display_name):
+    def lookup():
+        items = query("groupname#" + display_name, "group#")
+        return strip(newest(items)['sk'], "group#") if items else MISSING
+    group_id = read(lookup)
+    return None if group_id is MISSING else group_id
+
+
+def list_group_ids_for_user(user_id):
+    return read(lambda: [strip(item['pk'], "group#") for item in query("user#" + user_id, "group#", INVERTED_INDEX)])
+
+
+def list_user_ids_for_group(group_id):
+    return read(lambda: [strip(item['sk'], "user#") for item in query("group#" + group_id, "user#")])
+
+
+def membership(group_id, user_id):
+    # Same shape as identitystore GroupMemberships entries
+    return {"GroupId": group_id, "MemberId": {"UserId": user_id}}
+
+
+def list_group_memberships_for_member(user_id):
+    group_ids = list_group_ids_for_user(user_id)
+    return None if group_ids is None else [membership(group_id, user_id) for group_id in group_ids]
+
+
+def list_group_memberships(group_id):
+    user_ids = list_user_ids_for_group(group_id)
+    return None if user_ids is None else [membership(group_id, user_id) for user_id in user_ids]
+
+
+# Sync
+
+
+def expiry(now):
+    return int(now) + identity_mirror_item_ttl
+
+
+def needs_write(existing, item, now):
+    # Unchanged items are only rewritten once half of their lifetime has passed
+    if not existing:
+        return True
+    if any(existing.get(key) != value for key, value in item.items() if key != 'expireAt'):
+        return True
+    return int(existing.get('expireAt', 0)) - now < identity_mirror_item_ttl / 2
+
+
+def batch_get(keys):
+    return {(item['pk'], item['sk']): item for item in batch_get_items(identity_mirror_table_name, keys)}
+
+
+def write_diff(desired, existing, batch, now):
+    written = 0
+    for item in desired:
+        if needs_write(existing.get((item['pk'], item['sk'])), item, now):
+            batch.put_item(Item=item)
+            written += 1
+    return written
+
+
+def entity_items(kind, alias, entity_id, name, now, started_at):
+    items = [
+        {'pk': f"{kind}#{entity_id}", 'sk': META + entity_id, 'name': name, 'expireAt': expiry(now)},
+        {'pk': f"{alias}#{name}", 'sk': f"{kind}#{entity_id}", 'expireAt': expiry(now)},
+    ]
+    if kind == "group":
+        # Rewritten by every cycle, groups a completed cycle did not see were deleted
+        items.append({'pk': GROUPS_PK, 'sk': f"group#{entity_id}", 'name': name, 'seenIn': started_at,
+                      'expireAt': expiry(now)})
+    return items
+
+
+def sync_entities(batch, operation, result_key, kind, alias, id_field, name_field, token, now, started_at):
+    client = aws_clients.client('identitystore')
+    kwargs = {'IdentityStoreId': get_identity_store_id(), 'MaxResults': 100}
+    if token:
+        kwargs['NextToken'] = token
+    response = getattr(client, operation)(**kwargs)
+    desired = []
+    for entry in response[result_key]:
+        desired.extend(entity_items(kind, alias, entry[id_field], entry[name_field], now, started_at))
+    existing = batch_get([{'pk': item['pk'], 'sk': item['sk']} for item in desired])
+    return write_diff(desired, existing, batch, now), response.get('NextToken')
+
+
+def sync_group_members(batch, group_id, now):
+    client = aws_clients.client('identitystore')
+    desired = []
+    p = client.get_paginator('list_group_memberships')
+    for page in p.paginate(IdentityStoreId=get_identity_store_id(), GroupId=group_id):
+        for member in page['GroupMemberships']:
+            user_id = member.get('MemberId', {}).get('UserId')
+            if user_id:
+                desired.append({'pk': "group#" + group_id, 'sk': "user#" + user_id, 'expireAt': expiry(now)})
+    existing = {(item['pk'], item['sk']): item for item in query("group#" + group_id, "user#")}
+    written = write_diff(desired, existing, batch, now)
+    wanted = {(item['pk'], item['sk']) for item in desired}
+    removed = [key for key in existing if key not in wanted]
+    for pk, sk in removed:
+        batch.delete_item(Key={'pk': pk, 'sk': sk})
+    return written + len(removed)
+
+
+def query_all(pk):
+    # Expired items included, they are deleted along with the rest
+    kwargs = {'KeyConditionExpression': Key('pk').eq(pk)}
+    items = []
+    table = get_table()
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def drop_unseen_groups(batch, started_at):
+    """Deletes every group the cycle started at started_at did not see, with its
+    alias and memberships, instead of leaving them live until they expire."""
+    dropped = 0
+    for entry in query_all(GROUPS_PK):
+        if int(entry.get('seenIn', 0)) >= started_at:
+            continue
+        group_id = strip(entry['sk'], "group#")
+        keys = [(item['pk'], item['sk']) for item in query_all("group#" + group_id)]
+        keys += [(f"groupname#{entry['name']}", entry['sk']), (entry['pk'], entry['sk'])]
+        for pk, sk in keys:
+            batch.delete_item(Key={'pk': pk, 'sk': sk})
+        dropped += 1
+    if dropped:
+        print(f"Identity mirror dropped {dropped} deleted groups")
+    return dropped
+
+
+def sync(deadline):
+    """Advances the sync until deadline (epoch seconds), resuming from the stored
+    checkpoint. A full cycle walks users, then groups, then each group's members."""
+    table = get_table()
+    checkpoint = get_checkpoint() or {}
+    phase = checkpoint.get('phase', PHASES[0])
+    token = checkpoint.get('token')
+    offset = int(checkpoint.get('offset', 0))
+    started_at = int(checkpoint.get('startedAt', time.time()))
+    completed_at = checkpoint.get('completedAt')
+    client = aws_clients.client('identitystore')
+    written = 0
+    cycle_done = False
+    with table.batch_writer(overwrite_by_pkeys=['pk', 'sk']) as batch:
+        while time.time() < deadline:
+            try:
+                now = time.time()
+                if phase == "users":
+                    count, token = sync_entities(batch, 'list_users', 'Users', "user", "username", 'UserId', 'UserName', token, now, started_at)
+                elif phase == "groups":
+                    count, token = sync_entities(batch, 'list_groups', 'Groups', "group", "groupname", 'GroupId', 'DisplayName', token, now, started_at)
+                else:
+                    kwargs = {'IdentityStoreId': get_identity_store_id(), 'MaxResults': 100}
+                    if token:
+                        kwargs['NextToken'] = token
+                    response = client.list_groups(**kwargs)
+                    groups = response['Groups']
+                    count = 0
+                    while offset < len(groups) and time.time() < deadline:
+                        count += sync_group_members(batch, groups[offset]['GroupId'], now)
+                        offset += 1
+                    written += count
+                    if offset < len(groups):
+                        break
+                    token, offset = response.get('NextToken'), 0
+                    count = 0
+                written += count
+                if not token:
+                    next_index = PHASES.index(phase) + 1
+                    if next_index == len(PHASES):
+                        cycle_done = True
+                        break
+                    phase = PHASES[next_index]
+            except ClientError as e:
+                # Progress up to here is kept, the next run resumes from the checkpoint
+                print(e.response['Error']['Message'])
+                break
+            except UnprocessedKeysError as e:
+                print(e)
+                break
+    if cycle_done:
+        # Only once the groups' seenIn stamps are flushed, a drop in the same writer
+        # would read the previous cycle's stamps and replace the buffered puts
+        try:
+            with table.batch_writer(overwrite_by_pkeys=['pk', 'sk']) as batch:
+                drop_unseen_groups(batch, started_at)
+        except ClientError as e:
+            # The cycle is not completed, the next run redoes the memberships phase
+            print(e.response['Error']['Message'])
+        else:
+            completed_at = int(time.time())
+            started_at = completed_at
+            phase = PHASES[0]
+            print("Identity mirror sync cycle completed")
+    table.put_item(Item={
+        **CHECKPOINT_KEY,
+        'phase': phase,
+        'token': token,
+        'offset': offset,
+        'startedAt': started_at,
+        'completedAt': completed_at,
+    })
+    cache.invalidate()
+    print(f"Identity mirror sync wrote {written} items, next phase {phase}")
+    return completed_at
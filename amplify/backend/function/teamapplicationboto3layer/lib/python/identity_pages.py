@@ -0,0 +1,74 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import base64
+import json
+import os
+import aws_clients
+
+# Identity store pages are capped at 100 entries; a sparse name filter can need many
+# of them, so one call reads at most this many and hands back a token to continue
+identity_page_size = int(os.getenv("IDENTITY_PAGE_SIZE", "100"))
+identity_max_pages = int(os.getenv("IDENTITY_MAX_PAGES", "20"))
+DEFAULT_LIMIT = int(os.getenv("IDENTITY_DEFAULT_LIMIT", "50"))
+MAX_LIMIT = int(os.getenv("IDENTITY_MAX_LIMIT", "500"))
+
+USER_FIELDS = ("UserName", "UserId")
+GROUP_FIELDS = ("GroupId", "DisplayName")
+
+
+def encode_token(api_token, offset):
+    return base64.urlsafe_b64encode(json.dumps({"t": api_token, "o": offset}).encode()).decode()
+
+
+def decode_token(token):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return state["t"], int(state["o"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid nextToken")
+
+
+def project(entry, fields):
+    return {field: entry.get(field) for field in fields}
+
+
+def iter_entries(operation, result_key, fields, identity_store_id):
+    """Streams projected entries page by page instead of collecting the whole directory."""
+    p = aws_clients.client('identitystore').get_paginator(operation)
+    for page in p.paginate(IdentityStoreId=identity_store_id):
+        for entry in page[result_key]:
+            yield project(entry, fields)
+
+
+def list_page(operation, result_key, fields, name_field, identity_store_id, name_filter=None, limit=None, next_token=None):
+    """One page of at most limit entries whose name contains name_filter (case-insensitive).
+
+    nextToken carries the identity store token of the page being read and the offset
+    in it, so a page that is cut short by limit is resumed where it stopped."""
+    client = aws_clients.client('identitystore')
+    limit = max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+    needle = name_filter.lower() if name_filter else None
+    api_token, offset = decode_token(next_token) if next_token else (None, 0)
+    items = []
+    for _ in range(identity_max_pages):
+        kwargs = {"IdentityStoreId": identity_store_id, "MaxResults": identity_page_size}
+        if api_token:
+            kwargs["NextToken"] = api_token
+        response = getattr(client, operation)(**kwargs)
+        entries = response[result_key]
+        for index in range(offset, len(entries)):
+            entry = entries[index]
+            if needle and needle not in (entry.get(name_field) or "").lower():
+                continue
+            items.append(project(entry, fields))
+            if len(items) == limit:
+                if index + 1 < len(entries):
+                    return {"items": items, "nextToken": encode_token(api_token, index + 1)}
+                following = response.get("NextToken")
+                return {"items": items, "nextToken": encode_token(following, 0) if following else None}
+        api_token, offset = response.get("NextToken"), 0
+        if not api_token:
+            return {"items": items, "nextToken": None}
+    return {"items": items, "nextToken": encode_token(api_token, 0)}
@@ -0,0 +1,56 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import threading
+from botocore.exceptions import ClientError
+import aws_clients
+
+# Values are looked up on first use instead of at import time, and can be provided
+# at deployment time through SSO_INSTANCE_ARN, IDENTITY_STORE_ID and MGMT_ACCOUNT_ID
+values = {}
+lock = threading.Lock()
+
+
+def memoized(name, load):
+    if name not in values:
+        with lock:
+            if name not in values:
+                try:
+                    values[name] = load()
+                except ClientError as e:
+                    # Not memoized so that the next call tries again
+                    print(e.response['Error']['Message'])
+                    return None
+    return values[name]
+
+
+def list_existing_sso_instances():
+    response = aws_clients.client('sso-admin').list_instances()
+    return response['Instances'][0]
+
+
+def describe_organization():
+    response = aws_clients.client('organizations').describe_organization()
+    return response['Organization']['MasterAccountId']
+
+
+def get_instance_arn():
+    instance_arn = os.getenv("SSO_INSTANCE_ARN")
+    if instance_arn:
+        return instance_arn
+    sso_instance = memoized("sso_instance", list_existing_sso_instances)
+    return sso_instance['InstanceArn'] if sso_instance else None
+
+
+def get_identity_store_id():
+    identity_store_id = os.getenv("IDENTITY_STORE_ID")
+    if identity_store_id:
+        return identity_store_id
+    sso_instance = memoized("sso_instance", list_existing_sso_instances)
+    return sso_instance['IdentityStoreId'] if sso_instance else None
+
+
+def get_mgmt_account_id():
+    return os.getenv("MGMT_ACCOUNT_ID") or memoized("mgmt_account_id", describe_organization)
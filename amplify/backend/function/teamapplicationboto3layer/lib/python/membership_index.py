@@ -0,0 +1,154 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+
+membership_index_ttl = int(os.getenv("MEMBERSHIP_INDEX_TTL", "300"))
+membership_index_max_workers = int(os.getenv("MEMBERSHIP_INDEX_MAX_WORKERS", "10"))
+
+
+class Interner:
+    """Maps identity store ids to small ints so memberships can be kept as int arrays."""
+
+    def __init__(self):
+        self.ids = []
+        self.numbers = {}
+
+    def number(self, id):
+        number = self.numbers.get(id)
+        if number is None:
+            number = self.numbers[id] = len(self.ids)
+            self.ids.append(id)
+        return number
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def sorted_array(numbers):
+    return array('I', sorted(set(numbers)))
+
+
+class MembershipIndex:
+    """Group -> members and user -> groups as sorted unsigned int arrays, filled
+    lazily per group or per user and refreshed after ttl seconds."""
+
+    def __init__(self, ttl=membership_index_ttl):
+        self.ttl = ttl
+        self.users = Interner()
+        self.groups = Interner()
+        self.group_members = {}
+        self.user_groups = {}
+        self.loaded_at = {}
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def fresh(self, key, now):
+        return now - self.loaded_at.get(key, float("-inf")) < self.ttl
+
+    def set_group_members(self, group_id, user_ids):
+        with self.lock:
+            group = self.groups.number(group_id)
+            self.group_members[group] = sorted_array(self.users.number(user_id) for user_id in user_ids)
+            self.loaded_at[("group", group)] = time.monotonic()
+
+    def set_user_groups(self, user_id, group_ids):
+        with self.lock:
+            user = self.users.number(user_id)
+            self.user_groups[user] = sorted_array(self.groups.number(group_id) for group_id in group_ids)
+            self.loaded_at[("user", user)] = time.monotonic()
+
+    def stale_groups(self, group_ids):
+        now = time.monotonic()
+        with self.lock:
+            return [
+                group_id for group_id in dict.fromkeys(group_ids)
+                if group_id not in self.groups.numbers
+                or not self.fresh(("group", self.groups.numbers[group_id]), now)
+            ]
+
+    def members_of_any(self, group_ids, loader):
+        """User ids that belong to at least one of group_ids. loader(group_id) returns
+        the member user ids, or None on failure, and is only called for groups that
+        are not in the index or have expired."""
+        stale = self.stale_groups(group_ids)
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(membership_index_max_workers, len(stale))) as executor:
+                for group_id, user_ids in zip(stale, executor.map(loader, stale)):
+                    if user_ids is not None:
+                        self.set_group_members(group_id, user_ids)
+        with self.lock:
+            numbers = set()
+            for group_id in dict.fromkeys(group_ids):
+                group = self.groups.numbers.get(group_id)
+                if group is not None:
+                    numbers.update(self.group_members.get(group, ()))
+            return [self.users.ids[number] for number in sorted(numbers)]
+
+    def groups_of(self, user_id, loader):
+        """Group ids of user_id. loader(user_id) returns the user's group ids, or None
+        on failure, and is only called when the entry is missing or expired."""
+        now = time.monotonic()
+        with self.lock:
+            user = self.users.numbers.get(user_id)
+            cached = user is not None and self.fresh(("user", user), now)
+        if not cached:
+            group_ids = loader(user_id)
+            if group_ids is None:
+                return None
+            self.set_user_groups(user_id, group_ids)
+        with self.lock:
+            user = self.users.numbers[user_id]
+            return [self.groups.ids[number] for number in self.user_groups.get(user, ())]
+
+    def is_member(self, user_id, group_id):
+        """True or False when the group's members are indexed, None when they are not."""
+        with self.lock:
+            group = self.groups.numbers.get(group_id)
+            if group is None or group not in self.group_members:
+                return None
+            user = self.users.numbers.get(user_id)
+            if user is None:
+                return False
+            members = self.group_members[group]
+            position = bisect_left(members, user)
+            return position < len(members) and members[position] == user
+
+    def invalidate(self):
+        with self.lock:
+            self.group_members.clear()
+            self.user_groups.clear()
+            self.loaded_at.clear()
+
+    def revalidate(self, generation):
+        """Drops every entry when generation, e.g. the completion time of the identity
+        mirror's last sync, differs from the one the entries were loaded under."""
+        with self.lock:
+            if generation == self.generation:
+                return
+            self.generation = generation
+        self.invalidate()
+
+    def stats(self):
+        with self.lock:
+            arrays = list(self.group_members.values()) + list(self.user_groups.values())
+            edges = sum(len(members) for members in arrays)
+            array_bytes = sum(members.buffer_info()[1] * members.itemsize for members in arrays)
+            interned_bytes = sum(sys.getsizeof(id) for id in self.users.ids + self.groups.ids)
+            return {
+                "users": len(self.users),
+                "groups": len(self.groups),
+                "edges": edges,
+                "arrayBytes": array_bytes,
+                "internedBytes": interned_bytes,
+            }
+
+
+index = MembershipIndex()
@@ -0,0 +1,356 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from ttl_cache import TTLCache, MISSING
+
+# Organization structure mirrored in the org store table, seeded by a scheduled crawl
+# and kept current from Organizations events. Items:
+#   pk=ou#<id>       sk=meta            the OU (or root) and its parentId
+#   pk=ou#<id>       sk=ou#<child>      child OU of the OU
+#   pk=ou#<id>       sk=account#<acct>  account placed directly in the OU
+#   pk=account#<id>  sk=meta            the account and its parentId
+#   pk=root          sk=meta            root id and time of the last full crawl
+org_store_table_name = os.getenv("ORG_STORE_TABLE_NAME")
+org_store_ttl = int(os.getenv("ORG_STORE_TTL", "60"))
+# Organizations allows very few requests per second, keep the crawl narrow
+org_store_max_workers = int(os.getenv("ORG_STORE_MAX_WORKERS", "4"))
+org_parent_ttl = int(os.getenv("ORG_PARENT_TTL", "300"))
+org_parent_max_entries = int(os.getenv("ORG_PARENT_MAX_ENTRIES", "8192"))
+
+ROOT_KEY = {'pk': 'root', 'sk': 'meta'}
+META = "meta"
+
+cache = TTLCache(org_store_ttl, 1024)
+# child id -> parent, shared by every ancestor walk in the container
+parents = TTLCache(org_parent_ttl, org_parent_max_entries)
+
+
+def enabled():
+    return bool(org_store_table_name)
+
+
+def get_table():
+    return aws_clients.resource('dynamodb').Table(org_store_table_name)
+
+
+def ou_pk(ou_id):
+    return "ou#" + ou_id
+
+
+def account_pk(account_id):
+    return "account#" + account_id
+
+
+def parent_type(parent_id):
+    return "ROOT" if parent_id.startswith("r-") else "ORGANIZATIONAL_UNIT"
+
+
+def ou_items(ou, parent_id):
+    return [
+        {'pk': ou_pk(ou['Id']), 'sk': META, 'id': ou['Id'], 'name': ou['Name'], 'arn': ou['Arn'], 'parentId': parent_id},
+        {'pk': ou_pk(parent_id), 'sk': ou_pk(ou['Id']), 'id': ou['Id'], 'name': ou['Name']},
+    ]
+
+
+def account_items(account_id, name, parent_id):
+    return [
+        {'pk': account_pk(account_id), 'sk': META, 'id': account_id, 'name': name, 'parentId': parent_id},
+        {'pk': ou_pk(parent_id), 'sk': account_pk(account_id), 'id': account_id, 'name': name},
+    ]
+
+
+def invalidate():
+    cache.invalidate()
+    parents.invalidate()
+
+
+# Reads
+
+
+def get_root():
+    def load(key):
+        try:
+            return get_table().get_item(Key=ROOT_KEY).get("Item")
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return None
+    return cache.get_or_load("root", load) if enabled() else None
+
+
+def query_partition(pk, prefix=None, consistent=False):
+    condition = Key('pk').eq(pk)
+    if prefix:
+        condition = condition & Key('sk').begins_with(prefix)
+    kwargs = {'KeyConditionExpression': condition, 'ConsistentRead': consistent}
+    items = []
+    table = get_table()
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def list_accounts_for_parent(ou_id):
+    # None means the store cannot answer and the caller should ask Organizations
+    if not get_root():
+        return None
+    key = ("accounts", ou_id)
+    accounts = cache.get(key)
+    if accounts is MISSING:
+        try:
+            # Consistent, grants materialized right after an Organizations event
+            # must see the placement that event wrote
+            items = query_partition(ou_pk(ou_id), "account#", consistent=True)
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return None
+        accounts = [{"name": item['name'], 'id': item['id']} for item in items]
+        cache.set(key, accounts)
+    return list(accounts)
+
+
+def get_parent(child_id):
+    if not get_root():
+        return None
+    pk = ou_pk(child_id) if child_id.startswith("ou-") else account_pk(child_id)
+    try:
+        item = get_table().get_item(Key={'pk': pk, 'sk': META}).get("Item")
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    if not item or not item.get('parentId'):
+        return None
+    return {"Id": item['parentId'], "Type": parent_type(item['parentId'])}
+
+
+def lookup_parent(child_id):
+    parent = get_parent(child_id)
+    if parent:
+        return parent
+    try:
+        response = aws_clients.client('organizations').list_parents(ChildId=child_id)
+        return response["Parents"][0]
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+
+
+def parent_of(child_id):
+    parent = parents.get(child_id)
+    if parent is MISSING:
+        parent = lookup_parent(child_id)
+        if parent is None:
+            return None
+        parents.set(child_id, parent)
+    return parent
+
+
+def get_ancestors(child_id):
+    """Parents of an account or OU ordered from the nearest up to the root."""
+    ancestors = []
+    current = child_id
+    while not current.startswith("r-"):
+        parent = parent_of(current)
+        if not parent:
+            break
+        ancestors.append(parent)
+        current = parent["Id"]
+    return ancestors
+
+
+def get_ancestor_chains(child_ids):
+    child_ids = list(dict.fromkeys(child_ids))
+    if not child_ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(org_store_max_workers, len(child_ids))) as executor:
+        return dict(zip(child_ids, executor.map(get_ancestors, child_ids)))
+
+
+def scan():
+    items = []
+    kwargs = {}
+    table = get_table()
+    while True:
+        response = table.scan(**kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def get_tree():
+    root = get_root()
+    if not root:
+        return None
+    tree = cache.get("tree")
+    if tree is MISSING:
+        nodes = {}
+        children = {}
+        for item in scan():
+            if item['pk'].startswith("ou#") and item['sk'] == META:
+                nodes[item['id']] = {"Id": item['id'], "Arn": item['arn'], "Name": item['name']}
+                children.setdefault(item.get('parentId'), []).append(item['id'])
+        for ou_id, node in nodes.items():
+            node["Children"] = sorted((nodes[child] for child in children.get(ou_id, [])), key=lambda ou: ou["Name"])
+        tree = [nodes[root['rootId']]] if root['rootId'] in nodes else []
+        cache.set("tree", tree)
+    return tree
+
+
+# Full crawl
+
+
+def list_children(parent_id):
+    organizations = aws_clients.client('organizations')
+    ous = []
+    for page in organizations.get_paginator('list_organizational_units_for_parent').paginate(ParentId=parent_id):
+        ous.extend(page['OrganizationalUnits'])
+    accounts = []
+    for page in organizations.get_paginator('list_accounts_for_parent').paginate(ParentId=parent_id):
+        accounts.extend(page['Accounts'])
+    return ous, accounts
+
+
+def crawl():
+    root = aws_clients.client('organizations').list_roots()['Roots'][0]
+    items = [{'pk': ou_pk(root['Id']), 'sk': META, 'id': root['Id'], 'name': root['Name'], 'arn': root['Arn']}]
+    level = [root['Id']]
+    with ThreadPoolExecutor(max_workers=org_store_max_workers) as executor:
+        while level:
+            next_level = []
+            for parent_id, (ous, accounts) in zip(level, executor.map(list_children, level)):
+                for ou in ous:
+                    items.extend(ou_items(ou, parent_id))
+                    next_level.append(ou['Id'])
+                for account in accounts:
+                    items.extend(account_items(account['Id'], account['Name'], parent_id))
+            level = next_level
+    return root, items
+
+
+def seed():
+    try:
+        root, items = crawl()
+    except ClientError as e:
+        # A partial crawl would drop live OUs and accounts, keep the previous state
+        print(e.response['Error']['Message'])
+        return False
+    desired = {(item['pk'], item['sk']): item for item in items}
+    existing = {(item['pk'], item['sk']): item for item in scan() if item['pk'] != ROOT_KEY['pk']}
+    changed = [item for key, item in desired.items() if existing.get(key) != item]
+    removed = [key for key in existing if key not in desired]
+    print(f"Org store seed: {len(changed)} items written, {len(removed)} removed")
+    table = get_table()
+    with table.batch_writer() as batch:
+        for item in changed:
+            batch.put_item(Item=item)
+        for pk, sk in removed:
+            batch.delete_item(Key={'pk': pk, 'sk': sk})
+    table.put_item(Item={**ROOT_KEY, 'rootId': root['Id'], 'seededAt': int(time.time())})
+    invalidate()
+    return True
+
+
+# Incremental updates
+
+
+def get_meta(pk):
+    return get_table().get_item(Key={'pk': pk, 'sk': META}).get("Item")
+
+
+def put_items(items):
+    with get_table().batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+
+def delete_keys(keys):
+    with get_table().batch_writer() as batch:
+        for pk, sk in keys:
+            batch.delete_item(Key={'pk': pk, 'sk': sk})
+
+
+def describe_account_name(account_id):
+    response = aws_clients.client('organizations').describe_account(AccountId=account_id)
+    return response['Account']['Name']
+
+
+def place_account(account_id, name, parent_id):
+    current = get_meta(account_pk(account_id))
+    if current and current.get('parentId') != parent_id:
+        delete_keys([(ou_pk(current['parentId']), account_pk(account_id))])
+    if not name:
+        name = current['name'] if current else describe_account_name(account_id)
+    put_items(account_items(account_id, name, parent_id))
+
+
+def remove_account(account_id):
+    current = get_meta(account_pk(account_id))
+    keys = [(account_pk(account_id), META)]
+    if current:
+        keys.append((ou_pk(current['parentId']), account_pk(account_id)))
+    delete_keys(keys)
+
+
+def create_ou(ou, parent_id):
+    put_items(ou_items({'Id': ou['id'], 'Name': ou['name'], 'Arn': ou['arn']}, parent_id))
+
+
+def update_ou(ou):
+    current = get_meta(ou_pk(ou['id']))
+    if not current:
+        return False
+    create_ou(ou, current['parentId'])
+    return True
+
+
+def delete_ou(ou_id):
+    current = get_meta(ou_pk(ou_id))
+    keys = [(ou_pk(ou_id), META)]
+    if current:
+        keys.append((ou_pk(current['parentId']), ou_pk(ou_id)))
+    delete_keys(keys)
+
+
+def apply_event(event):
+    """Applies one Organizations event delivered by EventBridge, returns False when
+    the event could not be applied and the store was re-crawled instead."""
+    if not get_root():
+        return seed()
+    detail = event.get("detail", {})
+    name = detail.get("eventName")
+    request = detail.get("requestParameters") or {}
+    response = detail.get("responseElements") or {}
+    print(f"Applying {name} to the org store")
+    applied = True
+    if name == "CreateOrganizationalUnit":
+        create_ou(response["organizationalUnit"], request["parentId"])
+    elif name == "UpdateOrganizationalUnit":
+        applied = update_ou(response["organizationalUnit"])
+    elif name == "DeleteOrganizationalUnit":
+        delete_ou(request["organizationalUnitId"])
+    elif name == "MoveAccount":
+        place_account(request["accountId"], None, request["destinationParentId"])
+    elif name == "CreateAccountResult":
+        status = detail.get("serviceEventDetails", {}).get("createAccountStatus", {})
+        if status.get("state") == "SUCCEEDED":
+            # New accounts are always created in the root
+            place_account(status["accountId"], status.get("accountName"), get_root()['rootId'])
+    elif name == "RemoveAccountFromOrganization":
+        remove_account(request["accountId"])
+    else:
+        # Events without enough detail to apply, such as accepted invitations
+        applied = False
+    if not applied:
+        seed()
+    invalidate()
+    return applied
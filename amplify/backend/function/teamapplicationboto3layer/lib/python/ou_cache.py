@@ -0,0 +1,116 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
+from botocore.exceptions import ClientError
+from ttl_cache import TTLCache, MISSING
+import org_store
+
+ou_cache_ttl = int(os.getenv("OU_CACHE_TTL", "300"))
+ou_cache_max_entries = int(os.getenv("OU_CACHE_MAX_ENTRIES", "512"))
+# Organizations allows very few requests per second, keep the fan-out small
+ou_cache_max_workers = int(os.getenv("OU_CACHE_MAX_WORKERS", "4"))
+cache_table_name = os.getenv("CACHE_TABLE_NAME")
+
+ou_cache = TTLCache(ou_cache_ttl, ou_cache_max_entries)
+
+
+def cache_key(ou_id):
+    return "ou#" + ou_id
+
+
+def list_accounts_for_parent(ou_id):
+    accounts = []
+    p = aws_clients.client('organizations').get_paginator('list_accounts_for_parent')
+    for page in p.paginate(ParentId=ou_id):
+        for acct in page['Accounts']:
+            accounts.append({"name": acct['Name'], 'id': acct['Id']})
+    return accounts
+
+
+def get_cache_table():
+    return aws_clients.resource('dynamodb').Table(cache_table_name)
+
+
+def read_cache_table(ou_id, version=None):
+    try:
+        response = get_cache_table().get_item(Key={'id': cache_key(ou_id)})
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    item = response.get("Item")
+    if not item or int(item["expireAt"]) <= time.time():
+        return None
+    # Entries written under another eligibility version may predate an organization change
+    if version is not None and int(item.get("version", -1)) != version:
+        return None
+    return item["accounts"]
+
+
+def write_cache_table(ou_id, accounts, version=None):
+    item = {
+        'id': cache_key(ou_id),
+        'accounts': accounts,
+        'expireAt': int(time.time()) + ou_cache_ttl,
+    }
+    if version is not None:
+        item['version'] = version
+    try:
+        get_cache_table().put_item(Item=item)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+
+
+def load_accounts(ou_id, version=None):
+    # The org store is kept current from Organizations events, prefer it when seeded
+    accounts = org_store.list_accounts_for_parent(ou_id)
+    if accounts is not None:
+        ou_cache.set(ou_id, accounts, org_store.org_store_ttl)
+        return accounts
+    accounts = read_cache_table(ou_id, version) if cache_table_name else None
+    if accounts is None:
+        try:
+            accounts = list_accounts_for_parent(ou_id)
+        except ClientError as e:
+            # Failures are not cached so the next call tries Organizations again
+            print(e.response['Error']['Message'])
+            return []
+        if cache_table_name:
+            write_cache_table(ou_id, accounts, version)
+    ou_cache.set(ou_id, accounts)
+    return accounts
+
+
+def list_accounts_for_ous(ou_ids, version=None):
+    """Accounts directly under each of ou_ids. With version, the eligibility version,
+    the cache table tier only answers with entries written under that version."""
+    results = {}
+    missing = []
+    for ou_id in dict.fromkeys(ou_ids):
+        accounts = ou_cache.get(ou_id)
+        if accounts is MISSING:
+            missing.append(ou_id)
+        else:
+            results[ou_id] = accounts
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(ou_cache_max_workers, len(missing))) as executor:
+            for ou_id, accounts in zip(missing, executor.map(load_accounts, missing, [version] * len(missing))):
+                results[ou_id] = accounts
+    return {ou_id: list(accounts) for ou_id, accounts in results.items()}
+
+
+def list_account_for_ou(ou_id):
+    return list_accounts_for_ous([ou_id])[ou_id]
+
+
+def invalidate(ou_id=None):
+    ou_cache.invalidate(ou_id)
+    if cache_table_name and ou_id:
+        try:
+            get_cache_table().delete_item(Key={'id': cache_key(ou_id)})
+        except ClientError as e:
+            print(e.response['Error']['Message'])
@@ -0,0 +1,122 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+
+
+class PolicyIndex:
+    # Compiles resolved eligibility policies (accounts already expanded from OUs) into
+    # (accountId, permissionSetArn) -> grants lookups, longest duration first.
+    # account_id restricts the index to one account, for a single decision.
+    def __init__(self, policies, account_id=None):
+        self.grants = {}
+        for policy in policies:
+            grant = {
+                "policyId": policy.get("id"),
+                "policyName": policy.get("name"),
+                "approvalRequired": bool(policy["approvalRequired"]),
+                "maxDuration": int(policy["duration"]),
+            }
+            permission_ids = [permission["id"] for permission in policy["permissions"]]
+            for account in policy["accounts"]:
+                if account_id is not None and account["id"] != account_id:
+                    continue
+                for permission_id in permission_ids:
+                    self.grants.setdefault((account["id"], permission_id), []).append(grant)
+        for grants in self.grants.values():
+            grants.sort(key=lambda grant: grant["maxDuration"], reverse=True)
+
+    def cell(self, account_id, permission_id):
+        grants = self.grants.get((account_id, permission_id))
+        if not grants:
+            return None
+        return {
+            "approvalRequired": any(grant["approvalRequired"] for grant in grants),
+            "maxDuration": grants[0]["maxDuration"],
+        }
+
+    def cells(self):
+        for (account_id, permission_id) in self.grants:
+            yield account_id, permission_id, self.cell(account_id, permission_id)
+
+    def decide(self, account_id, permission_id, duration):
+        grants = self.grants.get((account_id, permission_id))
+        if not grants:
+            return {
+                "eligible": False,
+                "reason": f"no policy grants {permission_id} on account {account_id}",
+            }
+        eligible = [grant for grant in grants if grant["maxDuration"] >= int(duration)]
+        if not eligible:
+            return {
+                "eligible": False,
+                "maxDuration": grants[0]["maxDuration"],
+                "reason": f"requested duration {duration}h exceeds the maximum of {grants[0]['maxDuration']}h",
+            }
+        # Approval is required when any policy that allows the request requires it,
+        # matching how the request form decides whether approvers are needed
+        approval_required = any(grant["approvalRequired"] for grant in eligible)
+        matched = next(grant for grant in eligible if grant["approvalRequired"] == approval_required)
+        return {
+            "eligible": True,
+            "approvalRequired": approval_required,
+            "maxDuration": eligible[0]["maxDuration"],
+            "policyId": matched["policyId"],
+            "policyName": matched["policyName"],
+            "reason": f"allowed by policy {matched['policyName'] or matched['policyId']}",
+        }
+
+
+def entitlement_matrix(policies):
+    """Compact account x permission set matrix of resolved policies. Accounts and
+    permission sets are listed once and grants refer to them by position. A cell
+    requires approval when any policy granting it does and allows the longest
+    duration among them, as in PolicyIndex.cell. Accounts covered by the same set of
+    policies share all their cells, so cells are computed once per distinct set."""
+    accounts = {}
+    permissions = {}
+    covered_by = {}
+    for number, policy in enumerate(policies):
+        for permission in policy["permissions"]:
+            permissions.setdefault(permission["id"], permission)
+        for account in policy["accounts"]:
+            accounts.setdefault(account["id"], account)
+            covered_by[account["id"]] = covered_by.get(account["id"], 0) | 1 << number
+    permission_numbers = {permission_id: number for number, permission_id in enumerate(permissions)}
+    policy_cells = [
+        {
+            permission_numbers[permission["id"]]: (bool(policy["approvalRequired"]), int(policy["duration"]))
+            for permission in policy["permissions"]
+        }
+        for policy in policies
+    ]
+    accounts_by_mask = {}
+    for number, account_id in enumerate(accounts):
+        accounts_by_mask.setdefault(covered_by[account_id], []).append(number)
+    grouped = {}
+    for mask, account_numbers in accounts_by_mask.items():
+        cells = {}
+        for number, policy in enumerate(policy_cells):
+            if not mask >> number & 1:
+                continue
+            for permission, (approval_required, duration) in policy.items():
+                current = cells.get(permission)
+                if current:
+                    approval_required = approval_required or current[0]
+                    duration = max(duration, current[1])
+                cells[permission] = (approval_required, duration)
+        for permission, cell in cells.items():
+            grouped.setdefault((permission,) + cell, []).extend(account_numbers)
+    return {
+        "accounts": list(accounts.values()),
+        "permissions": list(permissions.values()),
+        "grants": [
+            {
+                "permission": permission,
+                "accounts": sorted(account_numbers),
+                "approvalRequired": approval_required,
+                "duration": str(duration),
+            }
+            for (permission, approval_required, duration), account_numbers in sorted(grouped.items())
+        ],
+    }
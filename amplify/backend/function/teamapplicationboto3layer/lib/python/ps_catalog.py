@@ -0,0 +1,175 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
+from batch_get import batch_get_items, UnprocessedKeysError
+from botocore.exceptions import ClientError
+from instance_config import get_instance_arn, get_mgmt_account_id
+from ttl_cache import TTLCache, MISSING
+
+# Snapshot of permission set metadata kept in the cache table and rebuilt by a
+# scheduled refresh, so resolvers do not call sso-admin on the request path
+ps_catalog_ttl = int(os.getenv("PS_CATALOG_TTL", "60"))
+# list_permission_sets only returns ARNs, so name and duration changes are picked
+# up by re-describing entries once they are older than this
+ps_catalog_max_age = int(os.getenv("PS_CATALOG_MAX_AGE", "86400"))
+ps_catalog_max_workers = int(os.getenv("PS_CATALOG_MAX_WORKERS", "8"))
+cache_table_name = os.getenv("CACHE_TABLE_NAME")
+
+MANIFEST_KEY = {'id': 'ps#catalog'}
+FIELDS = ('Name', 'Arn', 'Duration')
+
+snapshot = TTLCache(ps_catalog_ttl, 1)
+permission_sets = TTLCache(ps_catalog_ttl, 2048)
+
+
+def item_key(arn):
+    return "ps#" + arn
+
+
+def get_table():
+    return aws_clients.resource('dynamodb').Table(cache_table_name)
+
+
+def to_permission_set(item):
+    return {field: item.get(field) for field in FIELDS}
+
+
+def list_permission_sets(instance_arn):
+    arns = []
+    p = aws_clients.client('sso-admin').get_paginator('list_permission_sets')
+    for page in p.paginate(InstanceArn=instance_arn):
+        arns.extend(page['PermissionSets'])
+    return arns
+
+
+def list_mgmt_permission_sets(instance_arn):
+    arns = []
+    p = aws_clients.client('sso-admin').get_paginator('list_permission_sets_provisioned_to_account')
+    for page in p.paginate(InstanceArn=instance_arn, AccountId=get_mgmt_account_id()):
+        arns.extend(page['PermissionSets'])
+    return arns
+
+
+def describe_permission_set(instance_arn, arn):
+    try:
+        response = aws_clients.client('sso-admin').describe_permission_set(
+            InstanceArn=instance_arn,
+            PermissionSetArn=arn
+        )
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    return {
+        'Name': response['PermissionSet']['Name'],
+        'Arn': response['PermissionSet']['PermissionSetArn'],
+        'Duration': response['PermissionSet'].get('SessionDuration'),
+    }
+
+
+def batch_get(arns):
+    return batch_get_items(cache_table_name, [{'id': item_key(arn)} for arn in dict.fromkeys(arns)])
+
+
+def read_manifest():
+    return get_table().get_item(Key=MANIFEST_KEY).get("Item")
+
+
+def load():
+    catalog = snapshot.get("catalog")
+    if catalog is not MISSING:
+        return catalog
+    try:
+        manifest = read_manifest()
+        if not manifest:
+            return None
+        items = {item['Arn']: item for item in batch_get(manifest['arns'])}
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    except UnprocessedKeysError as e:
+        # An incomplete catalog must not be cached for the full TTL
+        print(e)
+        return None
+    catalog = {
+        "permissionSets": {arn: to_permission_set(items[arn]) for arn in manifest['arns'] if arn in items},
+        "mgmt": set(manifest.get('mgmt', [])),
+    }
+    snapshot.set("catalog", catalog)
+    return catalog
+
+
+def refresh():
+    instance_arn = get_instance_arn()
+    try:
+        arns = list_permission_sets(instance_arn)
+        manifest = read_manifest() or {}
+        known = {item['Arn']: item for item in batch_get(manifest.get('arns', []))}
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return None
+    except UnprocessedKeysError as e:
+        # Missing entries would be re-described and dropped from the manifest
+        print(e)
+        return None
+    now = int(time.time())
+    stale = [
+        arn for arn in arns
+        if arn not in known or now - int(known[arn].get('refreshedAt', 0)) > ps_catalog_max_age
+    ]
+    print(f"Refreshing {len(stale)} of {len(arns)} permission sets")
+    described = {}
+    if stale:
+        with ThreadPoolExecutor(max_workers=min(ps_catalog_max_workers, len(stale))) as executor:
+            for arn, permission_set in zip(stale, executor.map(lambda arn: describe_permission_set(instance_arn, arn), stale)):
+                if permission_set:
+                    described[arn] = permission_set
+    try:
+        mgmt = list_mgmt_permission_sets(instance_arn)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        mgmt = manifest.get('mgmt', [])
+    table = get_table()
+    with table.batch_writer() as batch:
+        for arn, permission_set in described.items():
+            batch.put_item(Item={'id': item_key(arn), 'refreshedAt': now, **permission_set})
+        for arn in set(known) - set(arns):
+            batch.delete_item(Key={'id': item_key(arn)})
+    # Entries that could not be described keep their previous metadata
+    current = [arn for arn in arns if arn in described or arn in known]
+    table.put_item(Item={**MANIFEST_KEY, 'arns': current, 'mgmt': mgmt, 'refreshedAt': now})
+    catalog = {
+        "permissionSets": {arn: described.get(arn) or to_permission_set(known[arn]) for arn in current},
+        "mgmt": set(mgmt),
+    }
+    snapshot.set("catalog", catalog)
+    permission_sets.invalidate()
+    return catalog
+
+
+def get_permission_set(arn):
+    permission_set = permission_sets.get(arn)
+    if permission_set is not MISSING:
+        return permission_set
+    try:
+        item = get_table().get_item(Key={'id': item_key(arn)}).get("Item")
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        item = None
+    if item:
+        permission_set = to_permission_set(item)
+    else:
+        # Created since the last refresh, describe it once and add it to the snapshot
+        permission_set = describe_permission_set(get_instance_arn(), arn)
+        if permission_set is None:
+            return None
+        try:
+            get_table().put_item(Item={'id': item_key(arn), 'refreshedAt': int(time.time()), **permission_set})
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+    permission_sets.set(arn, permission_set)
+    return permission_set
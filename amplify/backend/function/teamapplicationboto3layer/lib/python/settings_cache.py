@@ -0,0 +1,58 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import os
+import threading
+import time
+import aws_clients
+
+settings_max_staleness = int(os.getenv("SETTINGS_MAX_STALENESS", "30"))
+# AppSync sets updatedAt on every Settings mutation, so it doubles as the item version
+settings_version_attribute = os.getenv("SETTINGS_VERSION_ATTRIBUTE", "updatedAt")
+settings_key = {'id': 'settings'}
+
+
+class SettingsCache:
+    def __init__(self, table_name, max_staleness=settings_max_staleness):
+        self.table = aws_clients.resource('dynamodb').Table(table_name)
+        self.max_staleness = max_staleness
+        self.item = None
+        self.version = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+    def read_version(self):
+        response = self.table.get_item(
+            Key=settings_key,
+            ProjectionExpression="#version",
+            ExpressionAttributeNames={"#version": settings_version_attribute}
+        )
+        return response.get("Item", {}).get(settings_version_attribute)
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.item is not None and now - self.checked_at < self.max_staleness:
+                return self.item
+            if self.item is None or self.read_version() != self.version:
+                item = self.table.get_item(Key=settings_key).get("Item", {})
+                self.item = item
+                self.version = item.get(settings_version_attribute)
+            self.checked_at = now
+            return self.item
+
+    def invalidate(self):
+        with self.lock:
+            self.item = None
+            self.version = None
+
+
+settings_cache = None
+
+
+def get_settings():
+    global settings_cache
+    if settings_cache is None:
+        settings_cache = SettingsCache(os.getenv("SETTINGS_TABLE_NAME"))
+    return settings_cache.get()
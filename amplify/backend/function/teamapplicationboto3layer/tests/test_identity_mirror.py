@@ -0,0 +1,100 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Replays identity mirror sync cycles against moto's Identity Store and
+DynamoDB and checks the mirror against the identity store.
+Run from this directory with boto3, moto and pytest installed:
+
+    python -m pytest test_identity_mirror.py
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ["IDENTITY_MIRROR_TABLE_NAME"] = "TeamIdentityMirror-test"
+os.environ["IDENTITY_STORE_ID"] = "d-1234567890"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "python"))
+
+import boto3  # noqa: E402
+import pytest  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+import aws_clients  # noqa: E402
+import identity_mirror  # noqa: E402
+
+IDENTITY_STORE_ID = os.environ["IDENTITY_STORE_ID"]
+
+
+def run_cycle():
+    completed_at = identity_mirror.sync(time.time() + 60)
+    assert completed_at
+    return completed_at
+
+
+@pytest.fixture
+def store():
+    with mock_aws():
+        # Clients cached by an earlier test were created outside this mock
+        aws_clients.clients.clear()
+        aws_clients.resources.clear()
+        identity_mirror.cache.invalidate()
+        boto3.client('dynamodb').create_table(
+            TableName=os.environ["IDENTITY_MIRROR_TABLE_NAME"],
+            AttributeDefinitions=[
+                {'AttributeName': 'pk', 'AttributeType': 'S'},
+                {'AttributeName': 'sk', 'AttributeType': 'S'},
+            ],
+            KeySchema=[
+                {'AttributeName': 'pk', 'KeyType': 'HASH'},
+                {'AttributeName': 'sk', 'KeyType': 'RANGE'},
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': identity_mirror.INVERTED_INDEX,
+                'KeySchema': [
+                    {'AttributeName': 'sk', 'KeyType': 'HASH'},
+                    {'AttributeName': 'pk', 'KeyType': 'RANGE'},
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+            }],
+            BillingMode='PAY_PER_REQUEST',
+        )
+        # The first cycle started well before it completes, as it does when it
+        # spans several scheduled runs
+        identity_mirror.get_table().put_item(Item={
+            **identity_mirror.CHECKPOINT_KEY, 'phase': identity_mirror.PHASES[0], 'startedAt': int(time.time()) - 100,
+        })
+        identitystore = boto3.client('identitystore')
+        user_id = identitystore.create_user(
+            IdentityStoreId=IDENTITY_STORE_ID, UserName='alice', DisplayName='Alice',
+            Name={'GivenName': 'Alice', 'FamilyName': 'Example'},
+        )['UserId']
+        group_ids = {}
+        for number in range(5):
+            name = f"g{number}"
+            group_ids[name] = identitystore.create_group(IdentityStoreId=IDENTITY_STORE_ID, DisplayName=name)['GroupId']
+            identitystore.create_group_membership(
+                IdentityStoreId=IDENTITY_STORE_ID, GroupId=group_ids[name], MemberId={'UserId': user_id})
+        yield {'identitystore': identitystore, 'user_id': user_id, 'group_ids': group_ids}
+
+
+def test_steady_state_cycles_keep_every_group(store):
+    run_cycle()
+    run_cycle()
+    assert identity_mirror.ready()
+    assert sorted(identity_mirror.list_group_ids_for_user(store['user_id'])) == sorted(store['group_ids'].values())
+    assert identity_mirror.get_group_id("g4") == store['group_ids']["g4"]
+    assert identity_mirror.get_user_id("alice") == store['user_id']
+
+
+def test_deleted_group_is_dropped(store):
+    run_cycle()
+    store['identitystore'].delete_group(IdentityStoreId=IDENTITY_STORE_ID, GroupId=store['group_ids']["g0"])
+    run_cycle()
+    remaining = sorted(group_id for name, group_id in store['group_ids'].items() if name != "g0")
+    assert sorted(identity_mirror.list_group_ids_for_user(store['user_id'])) == remaining
+    assert identity_mirror.get_group_id("g0") is None
+    assert identity_mirror.list_user_ids_for_group(store['group_ids']["g0"]) == []
@@ -0,0 +1,179 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Replays Organizations events through org_store.apply_event against moto's
+Organizations and DynamoDB and checks the store against the organization.
+Run from this directory with boto3, moto and pytest installed:
+
+    python -m pytest test_org_store.py
+"""
+import os
+import sys
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ["ORG_STORE_TABLE_NAME"] = "TeamOrgStore-test"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib", "python"))
+
+import boto3  # noqa: E402
+import pytest  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+import aws_clients  # noqa: E402
+import org_store  # noqa: E402
+
+
+def event(name, request=None, response=None, **detail):
+    # Shape of the CloudTrail events EventBridge delivers for Organizations
+    return {
+        "source": "aws.organizations",
+        "detail": {
+            "eventName": name,
+            "requestParameters": request,
+            "responseElements": response,
+            **detail,
+        },
+    }
+
+
+def accounts_in(parent_id):
+    return sorted(account['id'] for account in org_store.list_accounts_for_parent(parent_id))
+
+
+def child_ous(parent_id):
+    return sorted(item['id'] for item in org_store.query_partition(org_store.ou_pk(parent_id), "ou#"))
+
+
+@pytest.fixture
+def org():
+    with mock_aws():
+        # Clients cached by an earlier test were created outside this mock
+        aws_clients.clients.clear()
+        aws_clients.resources.clear()
+        org_store.invalidate()
+        boto3.client('dynamodb').create_table(
+            TableName=os.environ["ORG_STORE_TABLE_NAME"],
+            AttributeDefinitions=[
+                {'AttributeName': 'pk', 'AttributeType': 'S'},
+                {'AttributeName': 'sk', 'AttributeType': 'S'},
+            ],
+            KeySchema=[
+                {'AttributeName': 'pk', 'KeyType': 'HASH'},
+                {'AttributeName': 'sk', 'KeyType': 'RANGE'},
+            ],
+            BillingMode='PAY_PER_REQUEST',
+        )
+        organizations = boto3.client('organizations')
+        organizations.create_organization(FeatureSet='ALL')
+        root_id = organizations.list_roots()['Roots'][0]['Id']
+        workloads = organizations.create_organizational_unit(ParentId=root_id, Name='Workloads')['OrganizationalUnit']
+        sandbox = organizations.create_organizational_unit(ParentId=root_id, Name='Sandbox')['OrganizationalUnit']
+        status = organizations.create_account(Email='prod@example.com', AccountName='prod')['CreateAccountStatus']
+        account_id = status['AccountId']
+        organizations.move_account(AccountId=account_id, SourceParentId=root_id, DestinationParentId=workloads['Id'])
+        assert org_store.seed()
+        yield {
+            'organizations': organizations,
+            'root_id': root_id,
+            'workloads': workloads,
+            'sandbox': sandbox,
+            'account_id': account_id,
+        }
+
+
+def test_seed_mirrors_the_organization(org):
+    assert child_ous(org['root_id']) == sorted([org['workloads']['Id'], org['sandbox']['Id']])
+    assert org['account_id'] in accounts_in(org['workloads']['Id'])
+    assert org_store.get_parent(org['account_id'])['Id'] == org['workloads']['Id']
+
+
+def test_create_organizational_unit(org):
+    ou = org['organizations'].create_organizational_unit(
+        ParentId=org['workloads']['Id'], Name='Prod')['OrganizationalUnit']
+    applied = org_store.apply_event(event(
+        "CreateOrganizationalUnit",
+        request={'parentId': org['workloads']['Id'], 'name': 'Prod'},
+        response={'organizationalUnit': {'id': ou['Id'], 'name': ou['Name'], 'arn': ou['Arn']}},
+    ))
+    assert applied
+    assert child_ous(org['workloads']['Id']) == [ou['Id']]
+    assert org_store.get_parent(ou['Id'])['Id'] == org['workloads']['Id']
+    assert [parent['Id'] for parent in org_store.get_ancestors(ou['Id'])] == [org['workloads']['Id'], org['root_id']]
+
+
+def test_move_account(org):
+    org['organizations'].move_account(
+        AccountId=org['account_id'], SourceParentId=org['workloads']['Id'], DestinationParentId=org['sandbox']['Id'])
+    applied = org_store.apply_event(event(
+        "MoveAccount",
+        request={
+            'accountId': org['account_id'],
+            'sourceParentId': org['workloads']['Id'],
+            'destinationParentId': org['sandbox']['Id'],
+        },
+    ))
+    assert applied
+    assert org['account_id'] not in accounts_in(org['workloads']['Id'])
+    assert org['account_id'] in accounts_in(org['sandbox']['Id'])
+    assert org_store.get_parent(org['account_id'])['Id'] == org['sandbox']['Id']
+    # The name is kept from the store instead of asked from Organizations
+    assert org_store.get_meta(org_store.account_pk(org['account_id']))['name'] == 'prod'
+
+
+def test_delete_organizational_unit(org):
+    org['organizations'].delete_organizational_unit(OrganizationalUnitId=org['sandbox']['Id'])
+    applied = org_store.apply_event(event(
+        "DeleteOrganizationalUnit",
+        request={'organizationalUnitId': org['sandbox']['Id']},
+    ))
+    assert applied
+    assert child_ous(org['root_id']) == [org['workloads']['Id']]
+    assert org_store.get_meta(org_store.ou_pk(org['sandbox']['Id'])) is None
+
+
+def test_create_account_result(org):
+    status = org['organizations'].create_account(Email='dev@example.com', AccountName='dev')['CreateAccountStatus']
+    applied = org_store.apply_event(event(
+        "CreateAccountResult",
+        serviceEventDetails={'createAccountStatus': {
+            'id': status['Id'],
+            'state': 'SUCCEEDED',
+            'accountName': 'dev',
+            'accountId': status['AccountId'],
+        }},
+    ))
+    assert applied
+    assert status['AccountId'] in accounts_in(org['root_id'])
+    assert org_store.get_parent(status['AccountId'])['Id'] == org['root_id']
+
+
+def test_failed_create_account_result_is_ignored(org):
+    applied = org_store.apply_event(event(
+        "CreateAccountResult",
+        serviceEventDetails={'createAccountStatus': {'state': 'FAILED', 'failureReason': 'EMAIL_ALREADY_EXISTS'}},
+    ))
+    assert applied
+    assert org['account_id'] not in accounts_in(org['root_id'])
+
+
+def test_remove_account_from_organization(org):
+    org['organizations'].remove_account_from_organization(AccountId=org['account_id'])
+    applied = org_store.apply_event(event(
+        "RemoveAccountFromOrganization",
+        request={'accountId': org['account_id']},
+    ))
+    assert applied
+    assert accounts_in(org['workloads']['Id']) == []
+    assert org_store.get_meta(org_store.account_pk(org['account_id'])) is None
+
+
+def test_unknown_event_reseeds(org):
+    # A change the store has not seen, picked up by the crawl the unknown event triggers
+    ou = org['organizations'].create_organizational_unit(
+        ParentId=org['sandbox']['Id'], Name='Experiments')['OrganizationalUnit']
+    applied = org_store.apply_event(event("AcceptHandshake", request={'handshakeId': 'h-0123456789'}))
+    assert not applied
+    assert child_ous(org['sandbox']['Id']) == [ou['Id']]
+    assert org_store.get_root()['rootId'] == org['root_id']
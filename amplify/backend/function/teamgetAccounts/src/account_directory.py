@@ -0,0 +1,70 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+
+def name_key(account):
+    return (account['name'].lower(), account['id'])
+
+
+def encode_token(ordering, key):
+    return base64.urlsafe_b64encode(json.dumps({"o": ordering, "k": key}).encode()).decode()
+
+
+def valid_key(ordering, key):
+    if ordering == "id":
+        return isinstance(key, str)
+    return isinstance(key, list) and len(key) == 2 and all(isinstance(part, str) for part in key)
+
+
+def decode_token(token, ordering):
+    """Sort key held by token. A token issued for the other ordering (an idPrefix
+    token reused without idPrefix or the reverse) or malformed raises ValueError,
+    which AppSync returns as a GraphQL error."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        key = state["k"]
+        if state["o"] != ordering or not valid_key(ordering, key):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid nextToken")
+    return tuple(key) if isinstance(key, list) else key
+
+
+class AccountDirectory:
+    """Accounts indexed by name and by id so that pages can be served without
+    scanning the whole organization. Page tokens hold the sort key of the last
+    account returned, so they stay valid when the directory is reloaded."""
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.by_name = sorted(accounts, key=name_key)
+        self.name_keys = [name_key(account) for account in self.by_name]
+        self.by_id = sorted(accounts, key=lambda account: account['id'])
+        self.ids = [account['id'] for account in self.by_id]
+
+    def search(self, name_contains=None, id_prefix=None, limit=100, next_token=None):
+        ordering = "id" if id_prefix else "name"
+        after = decode_token(next_token, ordering) if next_token else None
+        if id_prefix:
+            # Accounts sharing a prefix are contiguous in id order
+            ordered, sort_key = self.by_id, lambda account: account['id']
+            start = bisect_right(self.ids, after) if after else bisect_left(self.ids, id_prefix)
+        else:
+            ordered, sort_key = self.by_name, name_key
+            start = bisect_right(self.name_keys, after) if after else 0
+        needle = name_contains.lower() if name_contains else None
+        items = []
+        for account in ordered[start:]:
+            if id_prefix and not account['id'].startswith(id_prefix):
+                break
+            if needle and needle not in account['name'].lower():
+                continue
+            if len(items) == limit:
+                return {"items": items, "nextToken": encode_token(ordering, sort_key(items[-1]))}
+            items.append(account)
+        return {"items": items, "nextToken": None}
@@ -3,41 +3,60 @@
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 import json
-import boto3
+import aws_clients
+from instance_config import get_mgmt_account_id
 import os
 from botocore.exceptions import ClientError
-client = boto3.client('organizations')
+from ttl_cache import TTLCache
+from account_directory import AccountDirectory
+client = aws_clients.client('organizations')
 
 ACCOUNT_ID = os.environ['ACCOUNT_ID']
+ACCOUNT_DIRECTORY_TTL = int(os.getenv("ACCOUNT_DIRECTORY_TTL", "300"))
+DEFAULT_LIMIT = int(os.getenv("ACCOUNT_DIRECTORY_DEFAULT_LIMIT", "100"))
+MAX_LIMIT = int(os.getenv("ACCOUNT_DIRECTORY_MAX_LIMIT", "1000"))
 
+directory_cache = TTLCache(ACCOUNT_DIRECTORY_TTL, 1)
 
-def get_mgmt_account_id():
-    org_client = boto3.client('organizations')
-    try:
-        response = org_client.describe_organization()
-        return response['Organization']['MasterAccountId']
-    except ClientError as e:
-        print(e.response['Error']['Message'])
 
+def list_accounts(key=None):
+    account = []
+    mgmt_account_id = get_mgmt_account_id()
+    deployed_in_mgmt = True if ACCOUNT_ID == mgmt_account_id else False
+    p = client.get_paginator('list_accounts')
+    paginator = p.paginate()
+
+    for page in paginator:
+        for acct in page['Accounts']:
+            if not deployed_in_mgmt:
+                if acct['Id'] != mgmt_account_id:
+                    account.extend(
+                        [{"name": acct['Name'], 'id':acct['Id']}])
+            else:
+                account.extend([{"name": acct['Name'], 'id':acct['Id']}])
+    return AccountDirectory(account)
 
-mgmt_account_id = get_mgmt_account_id()
+
+def get_directory():
+    return directory_cache.get_or_load("accounts", list_accounts)
+
+
+def search_accounts(arguments):
+    limit = arguments.get("limit") or DEFAULT_LIMIT
+    return get_directory().search(
+        name_contains=arguments.get("nameContains"),
+        id_prefix=arguments.get("idPrefix"),
+        limit=max(1, min(limit, MAX_LIMIT)),
+        next_token=arguments.get("nextToken"),
+    )
 
 
 def handler(event, context):
-    account = []
-    deployed_in_mgmt = True if ACCOUNT_ID == mgmt_account_id else False
     try:
-        p = client.get_paginator('list_accounts')
-        paginator = p.paginate()
-
-        for page in paginator:
-            for acct in page['Accounts']:
-                if not deployed_in_mgmt:
-                    if acct['Id'] != mgmt_account_id:
-                        account.extend(
-                            [{"name": acct['Name'], 'id':acct['Id']}])
-                else:
-                    account.extend([{"name": acct['Name'], 'id':acct['Id']}])
-        return account
+        if event.get("fieldName") == "listAccounts":
+            # An invalid nextToken raises ValueError, returned to the caller as a GraphQL error
+            return search_accounts(event.get("arguments") or {})
+        # getAccounts keeps returning the full, unpaginated list
+        return [dict(account) for account in get_directory().accounts]
     except ClientError as e:
         print(e.response['Error']['Message'])
@@ -3,36 +3,35 @@
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 import os
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import ClientError
-import boto3
+import aws_clients
+from instance_config import get_identity_store_id
+from settings_cache import get_settings
+from entitlements import get_entitlements
+from batch_get import UnprocessedKeysError
+import identity_mirror
+from membership_index import index as membership_index
+from ttl_cache import TTLCache, MISSING
 
 user_pool_id = os.getenv("AUTH_AWSPIM06DBB7FC_USERPOOLID")
 team_admin_group = os.getenv("TEAM_ADMIN_GROUP")
 team_auditor_group = os.getenv("TEAM_AUDITOR_GROUP")
-settings_table_name = os.getenv("SETTINGS_TABLE_NAME")
-dynamodb = boto3.resource('dynamodb')
-settings_table = dynamodb.Table(settings_table_name)
-
-def get_settings():
-    response = settings_table.get_item(
-        Key={
-            'id': 'settings'
-        }
-    )
-    return response
+# Keyed on the group display names from Settings, so a settings change is a cache miss
+group_ids = TTLCache(int(os.getenv("GROUP_ID_CACHE_TTL", "300")), 16)
 
 def get_team_groups():
+    admin_group, auditor_group = team_admin_group, team_auditor_group
     try:
-        settings = get_settings()
-        item_settings = settings.get("Item", {})
-        team_admin_group = item_settings.get("teamAdminGroup", os.getenv("TEAM_ADMIN_GROUP"))
-        team_auditor_group = item_settings.get("teamAuditorGroup", os.getenv("TEAM_AUDITOR_GROUP"))
+        item_settings = get_settings()
+        admin_group = item_settings.get("teamAdminGroup", team_admin_group)
+        auditor_group = item_settings.get("teamAuditorGroup", team_auditor_group)
     except Exception as e:
         print(f"Error retrieving TEAM settings from database: {e}")
-    return team_admin_group, team_auditor_group
+    return admin_group, auditor_group
 
 def add_user_to_group(username, groupname):
-    client = boto3.client('cognito-idp')
+    client = aws_clients.client('cognito-idp')
     try:
         response = client.admin_add_user_to_group(
             UserPoolId=user_pool_id,
@@ -44,8 +43,20 @@ def add_user_to_group(username, groupname):
         print(e.response['Error']['Message'])
 
 
+def list_cognito_groups(username):
+    client = aws_clients.client('cognito-idp')
+    try:
+        groups = set()
+        p = client.get_paginator('admin_list_groups_for_user')
+        for page in p.paginate(UserPoolId=user_pool_id, Username=username):
+            groups.update(group['GroupName'] for group in page['Groups'])
+        return groups
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+
+
 def remove_user_from_group(username, groupname):
-    client = boto3.client('cognito-idp')
+    client = aws_clients.client('cognito-idp')
     try:
         response = client.admin_remove_user_from_group(
             UserPoolId=user_pool_id,
@@ -57,23 +68,14 @@ def remove_user_from_group(username, groupname):
         print(e.response['Error']['Message'])
 
 
-def get_identity_store_id():
-    client = boto3.client('sso-admin')
-    try:
-        response = client.list_instances()
-        return response['Instances'][0]['IdentityStoreId']
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-
-
-sso_instance = get_identity_store_id()
-
-
 def get_user(username):
+    user_id = identity_mirror.get_user_id(username)
+    if user_id:
+        return user_id
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         response = client.list_users(
-            IdentityStoreId=sso_instance,
+            IdentityStoreId=get_identity_store_id(),
             Filters=[
                 {
                     'AttributePath': 'UserName',
@@ -87,10 +89,25 @@ def get_user(username):
 
 
 def get_group(group):
+    if not group:
+        return None
+    group_id = group_ids.get(group)
+    if group_id is not MISSING:
+        return group_id
+    group_id = lookup_group(group)
+    if group_id:
+        group_ids.set(group, group_id)
+    return group_id
+
+
+def lookup_group(group):
+    group_id = identity_mirror.get_group_id(group)
+    if group_id:
+        return group_id
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         response = client.get_group_id(
-            IdentityStoreId=sso_instance,
+            IdentityStoreId=get_identity_store_id(),
             AlternateIdentifier={
                 'UniqueAttribute': {
                     'AttributePath': 'DisplayName',
@@ -105,10 +122,13 @@ def get_group(group):
 # Paginate
 
 def list_idc_group_membership(userId):
+    memberships = identity_mirror.list_group_memberships_for_member(userId)
+    if memberships is not None:
+        return memberships
     try:
-        client = boto3.client('identitystore')
+        client = aws_clients.client('identitystore')
         p = client.get_paginator('list_group_memberships_for_member')
-        paginator = p.paginate(IdentityStoreId=sso_instance,
+        paginator = p.paginate(IdentityStoreId=get_identity_store_id(),
             MemberId={
                 'UserId': userId
             })
@@ -120,32 +140,67 @@ def list_idc_group_membership(userId):
         print(e.response['Error']['Message'])
 
 
-def handler(event, context):
+def load_user_group_ids(userId):
+    memberships = list_idc_group_membership(userId)
+    return None if memberships is None else [group["GroupId"] for group in memberships]
+
+
+def resolve_groups(event):
     team_admin_group, team_auditor_group = get_team_groups()
-    print(event)
     user = event["identity"]["username"]
     # Strip idc prefix
     username = user.removeprefix("idc_")
-    userId = get_user(username)
-    admin = get_group(team_admin_group)
-    auditor = get_group(team_auditor_group)
-    groups = []
-    groupIds = []
-
-    groupData = list_idc_group_membership(userId)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        user_id = executor.submit(get_user, username)
+        admin = executor.submit(get_group, team_admin_group)
+        auditor = executor.submit(get_group, team_auditor_group)
+        current = executor.submit(list_cognito_groups, user)
+        # Group membership needs the user id, the other lookups carry on meanwhile
+        userId = user_id.result()
+        # None when the user's groups could not be listed, as opposed to no groups
+        groupIds = membership_index.groups_of(userId, load_user_group_ids) if userId else None
+    admin, auditor, current = admin.result(), auditor.result(), current.result()
 
-    for group in groupData:
-        groupIds.append(group["GroupId"])
-        if group['GroupId'] == admin:
-            add_user_to_group(user, "Admin")
-            groups.append("Admin")
-        elif group['GroupId'] == auditor:
-            add_user_to_group(user, "Auditors")
-            groups.append("Auditors")
+    groups = []
+    for group, name, group_id in (("Admin", team_admin_group, admin), ("Auditors", team_auditor_group, auditor)):
+        if groupIds is None or (name and not group_id):
+            # A failed lookup leaves the Cognito group as it is instead of removing the user
+            print(f"membership of {group} unknown for {user}, left unchanged")
+            if current and group in current:
+                groups.append(group)
+            continue
+        member = bool(group_id) and group_id in groupIds
+        if member:
+            groups.append(group)
+        # Only real changes are written, unknown Cognito state falls back to writing all
+        if member and (current is None or group not in current):
+            add_user_to_group(user, group)
+        elif not member and (current is None or group in current):
+            remove_user_from_group(user, group)
+
+    return {"groups": groups, "userId": userId, "groupIds": groupIds}
+
+
+def bootstrap_entitlements(userId, groupIds):
+    # Unknown groups or a failed read leave entitlements null instead of failing the
+    # login query, the client then asks getEntitlement
+    if groupIds is None:
+        return None
+    try:
+        return get_entitlements(userId, groupIds)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+    except UnprocessedKeysError as e:
+        print(e)
 
-    if "Admin" not in groups:
-        remove_user_from_group(user, "Admin")
-    elif "Auditors" not in groups:
-        remove_user_from_group(user, "Auditors")
 
-    return {"groups": groups, "userId": userId, "groupIds": groupIds}
\ No newline at end of file
+def handler(event, context):
+    print(event)
+    # Memberships indexed before the mirror's last completed sync are dropped
+    membership_index.revalidate(identity_mirror.get_completed_at())
+    result = resolve_groups(event)
+    if event.get("fieldName") == "getBootstrap":
+        # Entitlements reuse the membership lookup above instead of a second invocation
+        result["entitlements"] = bootstrap_entitlements(result["userId"], result["groupIds"])
+    result["groupIds"] = result["groupIds"] or []
+    return result
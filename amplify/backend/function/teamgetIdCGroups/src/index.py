@@ -3,33 +3,28 @@
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 from botocore.exceptions import ClientError
-import boto3
+from instance_config import get_identity_store_id
+from identity_pages import GROUP_FIELDS, iter_entries, list_page
 
-def get_identiy_store_id():
-    client = boto3.client('sso-admin')
+
+def list_idc_groups(IdentityStoreId):
     try:
-        response = client.list_instances()
-        return response['Instances'][0]['IdentityStoreId']
+        return list(iter_entries('list_groups', 'Groups', GROUP_FIELDS, IdentityStoreId))
     except ClientError as e:
         print(e.response['Error']['Message'])
 
 
-sso_instance = get_identiy_store_id()
-
-
-def list_idc_groups(IdentityStoreId):
+def list_groups_page(IdentityStoreId, arguments):
     try:
-        client = boto3.client('identitystore')
-        p = client.get_paginator('list_groups')
-        paginator = p.paginate(IdentityStoreId=IdentityStoreId)
-        all_groups = []
-        for page in paginator:
-            all_groups.extend(page["Groups"])
-        return all_groups
+        return list_page('list_groups', 'Groups', GROUP_FIELDS, 'DisplayName', IdentityStoreId,
+                         name_filter=arguments.get("filter"),
+                         limit=arguments.get("limit"),
+                         next_token=arguments.get("nextToken"))
     except ClientError as e:
         print(e.response['Error']['Message'])
 
 
 def handler(event, context):
-    return list_idc_groups(sso_instance)
-
+    if event.get("fieldName") == "listIdCGroups":
+        return list_groups_page(get_identity_store_id(), event.get("arguments") or {})
+    return list_idc_groups(get_identity_store_id())
@@ -3,20 +3,15 @@
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 import json
-import boto3
-from botocore.exceptions import ClientError
-
-client = boto3.client('organizations')
+import org_store
 
 
 def handler(event, context):
+    if event.get("fieldName") == "getOUAncestors":
+        ids = event["arguments"].get("ids") or []
+        chains = org_store.get_ancestor_chains(ids)
+        return [{"id": id, "ancestors": chains[id]} for id in dict.fromkeys(ids)]
     id = event["arguments"]["id"]
     print(event)
     print(id)
-    try:
-        response = client.list_parents(
-            ChildId=id
-        )
-        return response["Parents"][0]
-    except ClientError as e:
-        print(e.response['Error']['Message'])
+    return org_store.parent_of(id)
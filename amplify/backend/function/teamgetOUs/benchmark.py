@@ -0,0 +1,100 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares crawling the OU tree depth first, one call at a time as teamgetOUs
+did before, with the breadth first build_ou_tree, against a synthetic
+organization that adds a fixed latency per call and makes no AWS calls.
+Run from this directory with boto3 installed:
+
+    python benchmark.py --depth 4 --fanout 4 --latency-ms 40
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+sys.path.insert(0, os.path.join(HERE, "..", "teamapplicationboto3layer", "lib", "python"))
+sys.path.insert(0, os.path.join(HERE, "src"))
+
+import index  # noqa: E402
+
+
+class Organizations:
+    """Lists child OUs from memory, each call costs latency seconds."""
+
+    def __init__(self, children, latency):
+        self.children = children
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def list_organizational_units_for_parent(self, ParentId, NextToken=None):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {"OrganizationalUnits": [{"Id": id, "Name": id} for id in self.children.get(ParentId, [])]}
+
+
+def synthetic(depth, fanout):
+    children = {}
+    level = ["r-root"]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            children[parent] = [f"{parent}-{child}" for child in range(fanout)]
+            next_level.extend(children[parent])
+        level = next_level
+    return children
+
+
+def depth_first(root):
+    # Before: recursive, one ListOrganizationalUnitsForParent call after the other
+    def get_ou_tree(ou_id):
+        ou_list = []
+        for ou in index.getOUs(ou_id):
+            ou["Children"] = get_ou_tree(ou["Id"])
+            ou_list.append(ou)
+        return ou_list
+    root["Children"] = get_ou_tree(root["Id"])
+
+
+def breadth_first(root):
+    # After: one concurrent round of calls per level, max_workers at a time
+    index.build_ou_tree(root)
+
+
+def count(ou):
+    return 1 + sum(count(child) for child in ou["Children"])
+
+
+def measure(crawl, organizations):
+    organizations.calls = 0
+    root = {"Id": "r-root", "Name": "Root"}
+    started = time.perf_counter()
+    crawl(root)
+    return count(root), organizations.calls, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    parser.add_argument("--workers", type=int, default=index.max_workers)
+    args = parser.parse_args()
+
+    organizations = Organizations(synthetic(args.depth, args.fanout), args.latency_ms / 1000)
+    index.client = organizations
+    index.max_workers = args.workers
+    print(f"depth {args.depth}, fanout {args.fanout}, {args.latency_ms} ms per call, {args.workers} workers")
+    for name, crawl in (("depth first", depth_first), ("breadth first", breadth_first)):
+        ous, calls, elapsed = measure(crawl, organizations)
+        print(f"{name:<22} {ous:>6} OUs {calls:>6} calls {elapsed * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
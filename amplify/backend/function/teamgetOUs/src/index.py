@@ -3,10 +3,21 @@
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
 import json
-import boto3
+import os
+from concurrent.futures import ThreadPoolExecutor
+import aws_clients
 from botocore.exceptions import ClientError
+from ttl_cache import TTLCache, MISSING
+import org_store
+from entitlements import bump_version
+import grants
 
-client = boto3.client('organizations')
+client = aws_clients.client('organizations')
+
+# Organizations throttles hard, the shared client already retries with adaptive
+# client-side rate limiting, so the pool only needs to stay small
+max_workers = int(os.getenv("MAX_WORKERS", "4"))
+ou_tree_cache = TTLCache(int(os.getenv("OU_TREE_TTL", "300")), 1)
 
 
 def getOUs(id):
@@ -21,19 +32,48 @@ def getOUs(id):
         return results
     except ClientError as e:
         print(e.response['Error']['Message'])
-        
-def get_ou_tree(ou_id):
-    ou_list = []
-    ous = getOUs(ou_id)
-    for ou in ous:
-        sub_ous = get_ou_tree(ou["Id"])
-        ou["Children"] = sub_ous
-        ou_list.append(ou)
-    return ou_list
 
-def handler(event, context):
+
+def build_ou_tree(root):
+    # Breadth first, one concurrent round of calls per level of the hierarchy
+    complete = True
+    level = [root]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while level:
+            next_level = []
+            for ou, children in zip(level, executor.map(getOUs, [ou["Id"] for ou in level])):
+                if children is None:
+                    complete = False
+                    children = []
+                ou["Children"] = children
+                next_level.extend(children)
+            level = next_level
+    return complete
+
+
+def get_ou_tree():
+    OUs = ou_tree_cache.get("tree")
+    if OUs is not MISSING:
+        return OUs
     OUs = client.list_roots().get('Roots')
-    root_ou_id = OUs[0].get('Id')
-    ou_tree = get_ou_tree(root_ou_id)
-    OUs[0]["Children"] = ou_tree
+    # A partial tree is returned but not cached
+    if build_ou_tree(OUs[0]):
+        ou_tree_cache.set("tree", OUs)
     return OUs
+
+
+def handler(event, context):
+    # Scheduled invocations re-crawl the organization, Organizations events
+    # update the org store in place, AppSync invocations read from it
+    # Either can move accounts between OUs, so cached entitlements are made stale
+    if event.get("source") == "aws.events":
+        if org_store.seed():
+            bump_version()
+            grants.rebuild()
+        return
+    if event.get("source") == "aws.organizations":
+        org_store.apply_event(event)
+        bump_version()
+        grants.refresh_ous()
+        return
+    return org_store.get_tree() or get_ou_tree()
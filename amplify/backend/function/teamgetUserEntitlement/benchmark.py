@@ -0,0 +1,76 @@
+# © 2023 Amazon Web Services, Inc. or its affiliates. All Rights Reserved.
+# This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
+# http: // aws.amazon.com/agreement or other written agreement between Customer and either
+# Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+"""Compares the payload size and serialization time of getEntitlement and
+getEntitlementMatrix for a user in several broad groups, using synthetic
+policies and no AWS calls. Run from this directory with boto3 installed:
+
+    python benchmark.py --accounts 2000 --groups 8 --permissions 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "teamapplicationboto3layer", "lib", "python"))
+
+from entitlements import expand, to_entitlements, to_matrix  # noqa: E402
+
+
+def synthetic(accounts, groups, permissions, ous):
+    ou_accounts = {
+        f"ou-{ou}": [
+            {"name": f"account-{i}", "id": f"{i:012d}"}
+            for i in range(accounts) if i % ous == ou
+        ]
+        for ou in range(ous)
+    }
+    policies = []
+    for group in range(groups):
+        policies.append({
+            "id": f"group-{group}",
+            "name": f"group-{group}",
+            # Every group is granted most of the organization through its OUs
+            "ous": [{"name": f"ou-{ou}", "id": f"ou-{ou}"} for ou in range(ous) if ou != group % ous],
+            "accounts": [{"name": f"account-{group}", "id": f"{group:012d}"}],
+            "permissions": [
+                {"name": f"permission-set-{p}", "id": f"arn:aws:sso:::permissionSet/ssoins-0000000000000000/ps-{p:016d}"}
+                for p in range(group % 2, permissions + group % 2)
+            ],
+            "approvalRequired": group % 3 != 0,
+            "duration": str(1 + group % 8),
+        })
+    return policies, ou_accounts
+
+
+def measure(shape, policies, repeat):
+    payload = None
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = json.dumps(shape(policies))
+    elapsed = (time.perf_counter() - started) / repeat
+    return len(payload.encode()), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--permissions", type=int, default=4)
+    parser.add_argument("--ous", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    policies, ou_accounts = synthetic(args.accounts, args.groups, args.permissions, args.ous)
+    resolved = expand(policies, ou_accounts)
+    print(f"{args.accounts} accounts, {args.groups} policies, {args.permissions} permission sets each")
+    for name, shape in (("getEntitlement", to_entitlements), ("getEntitlementMatrix", to_matrix)):
+        size, elapsed = measure(shape, resolved, args.repeat)
+        print(f"{name:<22} {size / 1024:>10.1f} KiB {elapsed * 1000:>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
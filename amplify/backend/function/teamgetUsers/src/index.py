@@ -2,32 +2,36 @@
 # This AWS Content is provided subject to the terms of the AWS Customer Agreement available at
 # http: // aws.amazon.com/agreement or other written agreement between Customer and either
 # Amazon Web Services, Inc. or Amazon Web Services EMEA SARL or both.
+import time
 from botocore.exceptions import ClientError
-import boto3
+from instance_config import get_identity_store_id
+from identity_pages import USER_FIELDS, iter_entries, list_page
+import identity_mirror
 
-def get_identiy_store_id():
-    client = boto3.client('sso-admin')
+
+def list_idc_users(IdentityStoreId):
     try:
-        response = client.list_instances()
-        return response['Instances'][0]['IdentityStoreId']
+        return list(iter_entries('list_users', 'Users', USER_FIELDS, IdentityStoreId))
     except ClientError as e:
         print(e.response['Error']['Message'])
 
 
-sso_instance = get_identiy_store_id()
-        
-def list_idc_users(IdentityStoreId):
+def list_users_page(IdentityStoreId, arguments):
     try:
-        client = boto3.client('identitystore')
-        p = client.get_paginator('list_users')
-        paginator = p.paginate(IdentityStoreId=IdentityStoreId)
-        all_users = []
-        for page in paginator:
-            all_users.extend(page["Users"])
-        return all_users
+        return list_page('list_users', 'Users', USER_FIELDS, 'UserName', IdentityStoreId,
+                         name_filter=arguments.get("filter"),
+                         limit=arguments.get("limit"),
+                         next_token=arguments.get("nextToken"))
     except ClientError as e:
         print(e.response['Error']['Message'])
 
 
 def handler(event, context):
-    return list_idc_users(sso_instance)
+    # Scheduled invocations advance the identity mirror sync
+    if event.get("source") == "aws.events":
+        remaining = context.get_remaining_time_in_millis() / 1000
+        identity_mirror.sync(time.time() + remaining - 15)
+        return
+    if event.get("fieldName") == "listUsers":
+        return list_users_page(get_identity_store_id(), event.get("arguments") or {})
+    return list_idc_users(get_identity_store_id())
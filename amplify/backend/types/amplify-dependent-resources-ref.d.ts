@@ -23,9 +23,25 @@ export type AmplifyDependentResourcesAttributes = {
     }
   },
   "custom": {
+    "cache": {
+      "CacheTableArnOutput": "string",
+      "CacheTableNameOutput": "string"
+    },
     "cloudtrailLake": {
       "EventDataStoreOutput": "string"
     },
+    "grants": {
+      "GrantsTableArnOutput": "string",
+      "GrantsTableNameOutput": "string"
+    },
+    "identitymirror": {
+      "IdentityMirrorTableArnOutput": "string",
+      "IdentityMirrorTableNameOutput": "string"
+    },
+    "orgstore": {
+      "OrgStoreTableArnOutput": "string",
+      "OrgStoreTableNameOutput": "string"
+    },
     "sns": {
       "NotificationTopicArn": "string"
     },
@@ -9,7 +9,7 @@ import awsconfig from "./aws-exports";
 import Nav from "./components/Navigation/Nav";
 import home from "./media/Home.svg";
 import "./index.css";
-import { fetchGroups } from "./components/Shared/RequestService";
+import { fetchBootstrap } from "./components/Shared/RequestService";
 import { Button } from "@awsui/components-react";
 
 const { Header, Content } = Layout;
@@ -41,6 +41,7 @@ function App() {
   const [cognitoGroups, setcognitoGroups] = useState([]);
   const [userId, setUserId] = useState(null);
   const [groupIds, setGroupIds] = useState(null);
+  const [entitlements, setEntitlements] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -74,9 +75,11 @@ function App() {
     getUser().then((userData) => {
       setUser(userData);
       setcognitoGroups(userData.signInUserSession.idToken.payload['cognito:groups'])
-      fetchGroups(userData.username).then(({userId,groupIds,groups})  => {
+      fetchBootstrap().then(({userId,groupIds,groups,entitlements})  => {
         setUserId(userId)
         setGroupIds( groupIds );
+        // Kept with its load time, the request page only reuses it while it is recent
+        setEntitlements( entitlements ? { items: entitlements, loadedAt: Date.now() } : null );
         setGroups( groups );
         setLoading(false);
       });
@@ -96,7 +99,7 @@ function App() {
   return (
     <div>
       {groups ? (
-        <Nav user={user} groupIds={groupIds} userId={userId} groups={groups} cognitoGroups={cognitoGroups} />
+        <Nav user={user} groupIds={groupIds} userId={userId} groups={groups} entitlements={entitlements} cognitoGroups={cognitoGroups} />
       ) : (
         <Home loading={loading} />
       )}
@@ -92,6 +92,7 @@ function Nav(props) {
                     group={group}
                     userId={props.userId}
                     groupIds={props.groupIds}
+                    entitlements={props.entitlements}
                   />
                 </Route>
                 <Route path="/approvals/approve">
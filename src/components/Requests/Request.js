@@ -19,7 +19,7 @@ import {
   getGroupMemberships,
   requestTeam,
   fetchApprovers,
-  fetchOU,
+  fetchOUAncestors,
   fetchEntitlement,
   getSetting,
   getMgmtAccountPs
@@ -27,6 +27,9 @@ import {
 import { useHistory } from "react-router-dom";
 import params from "../../parameters.json";
 
+// ENTITLEMENT_CACHE_TTL of teamgetUserEntitlement, in milliseconds
+const BOOTSTRAP_ENTITLEMENTS_TTL = 5 * 60 * 1000;
+
 function Request(props) {
   const [email, setEmail] = useState("");
 
@@ -112,7 +115,21 @@ function Request(props) {
     return permissionData
   }
 
+  function setEligibility(data) {
+    setItem(data)
+    setAccounts(concatenateAccounts(data))
+  }
+
   const getEligibility = () => {
+    // Resolved by the login bootstrap, reused without a second round trip until it
+    // is older than the entitlement cache TTL, so later policy changes show up
+    const bootstrap = props.entitlements;
+    if (bootstrap && Date.now() - bootstrap.loadedAt < BOOTSTRAP_ENTITLEMENTS_TTL) {
+      setEligibility(bootstrap.items);
+      setAccountStatus("finished");
+      setPermissionStatus("finished");
+      return;
+    }
     let args = {
       userId: props.userId,
       groupIds: props.groupIds,
@@ -121,8 +138,7 @@ function Request(props) {
     setPermissionStatus("loading");
     fetchEntitlement(args).then((data) => {
       if (data !== null) {
-        setItem(data)
-        setAccounts(concatenateAccounts(data))
+        setEligibility(data)
       }
       setAccountStatus("finished");
       setPermissionStatus("finished");
@@ -273,25 +289,20 @@ function Request(props) {
     if (await checkApprovalNotRequired(account,role)){
       return true
     }
-    const account_approvers = await fetchApprovers(account, "Account");
-    if (account_approvers) {
-      const data = await getGroupMemberships(account_approvers.groupIds);
-      if (checkGroupMembership(props.groupIds,account_approvers.groupIds) && data.members.length < 2){
-        return false;
-      }
-      else if (data.members.length > 0){
-        return account_approvers;
-      }
-    }
-    const ou = await fetchOU(account);
-    const ou_approvers = await fetchApprovers(ou.Id, "OU");
-    if (ou_approvers) {
-      const data = await getGroupMemberships(ou_approvers.groupIds);
-      if (checkGroupMembership(props.groupIds,ou_approvers.groupIds) && data.members.length < 2){
-        return false;
-      }
-      else if (data.members.length > 0){
-        return ou_approvers;
+    // Approvers set on the account win, then the nearest OU up to the root
+    const chains = await fetchOUAncestors([account]);
+    const ancestors = (chains && chains.length && chains[0].ancestors) || [];
+    const ids = [account, ...ancestors.map((ou) => ou.Id)];
+    for (const id of ids) {
+      const approvers = await fetchApprovers(id, id === account ? "Account" : "OU");
+      if (approvers) {
+        const data = await getGroupMemberships(approvers.groupIds);
+        if (checkGroupMembership(props.groupIds,approvers.groupIds) && data.members.length < 2){
+          return false;
+        }
+        else if (data.members.length > 0){
+          return approvers;
+        }
       }
     }
     return false;
@@ -14,8 +14,10 @@ import {
   getLogs,
   getOUs,
   getOU,
+  getOUAncestors,
   requestByEmailAndStatus,
   getGroups,
+  getBootstrap,
   getIdCGroups,
   getUsers,
   listEligibilities,
@@ -113,6 +115,19 @@ export async function fetchOU(id) {
     console.log("error fetching OU");
   }
 }
+export async function fetchOUAncestors(ids) {
+  try {
+    const OUs = await API.graphql(
+      graphqlOperation(getOUAncestors, {
+        ids: ids,
+      })
+    );
+    const data = await OUs.data.getOUAncestors;
+    return data;
+  } catch (err) {
+    console.log("error fetching OU ancestors");
+  }
+}
 export async function getGroupMemberships(id) {
   try {
     const members = await API.graphql(
@@ -137,6 +152,16 @@ export async function fetchGroups() {
   }
 }
 
+export async function fetchBootstrap() {
+  try {
+    const bootstrap = await API.graphql(graphqlOperation(getBootstrap));
+    const data = await bootstrap.data.getBootstrap;
+    return data;
+  } catch (err) {
+    console.log("error fetching Bootstrap");
+  }
+}
+
 export async function fetchIdCGroups() {
   try {
     const groups = await API.graphql(graphqlOperation(getIdCGroups));
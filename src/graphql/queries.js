@@ -368,6 +368,27 @@ export const getAccounts = /* GraphQL */ `
     }
   }
 `;
+export const listAccounts = /* GraphQL */ `
+  query ListAccounts(
+    $nameContains: String
+    $idPrefix: String
+    $limit: Int
+    $nextToken: String
+  ) {
+    listAccounts(
+      nameContains: $nameContains
+      idPrefix: $idPrefix
+      limit: $limit
+      nextToken: $nextToken
+    ) {
+      items {
+        name
+        id
+      }
+      nextToken
+    }
+  }
+`;
 export const getOUs = /* GraphQL */ `
   query GetOUs {
     getOUs {
@@ -419,6 +440,16 @@ export const getOU = /* GraphQL */ `
     }
   }
 `;
+export const getOUAncestors = /* GraphQL */ `
+  query GetOUAncestors($ids: [String]) {
+    getOUAncestors(ids: $ids) {
+      id
+      ancestors {
+        Id
+      }
+    }
+  }
+`;
 export const getPermissions = /* GraphQL */ `
   query GetPermissions {
     getPermissions {
@@ -444,6 +475,27 @@ export const getGroups = /* GraphQL */ `
     }
   }
 `;
+export const getBootstrap = /* GraphQL */ `
+  query GetBootstrap {
+    getBootstrap {
+      groups
+      userId
+      groupIds
+      entitlements {
+        accounts {
+          name
+          id
+        }
+        permissions {
+          name
+          id
+        }
+        approvalRequired
+        duration
+      }
+    }
+  }
+`;
 export const getIdCGroups = /* GraphQL */ `
   query GetIdCGroups {
     getIdCGroups {
@@ -460,6 +512,28 @@ export const getUsers = /* GraphQL */ `
     }
   }
 `;
+export const listIdCGroups = /* GraphQL */ `
+  query ListIdCGroups($filter: String, $limit: Int, $nextToken: String) {
+    listIdCGroups(filter: $filter, limit: $limit, nextToken: $nextToken) {
+      items {
+        GroupId
+        DisplayName
+      }
+      nextToken
+    }
+  }
+`;
+export const listUsers = /* GraphQL */ `
+  query ListUsers($filter: String, $limit: Int, $nextToken: String) {
+    listUsers(filter: $filter, limit: $limit, nextToken: $nextToken) {
+      items {
+        UserName
+        UserId
+      }
+      nextToken
+    }
+  }
+`;
 export const getLogs = /* GraphQL */ `
   query GetLogs($queryId: String) {
     getLogs(queryId: $queryId) {
@@ -486,6 +560,26 @@ export const getEntitlement = /* GraphQL */ `
     }
   }
 `;
+export const getEntitlementMatrix = /* GraphQL */ `
+  query GetEntitlementMatrix($userId: String, $groupIds: [String]) {
+    getEntitlementMatrix(userId: $userId, groupIds: $groupIds) {
+      accounts {
+        name
+        id
+      }
+      permissions {
+        name
+        id
+      }
+      grants {
+        permission
+        accounts
+        approvalRequired
+        duration
+      }
+    }
+  }
+`;
 export const listGroups = /* GraphQL */ `
   query ListGroups($groupIds: [String]) {
     listGroups(groupIds: $groupIds) {